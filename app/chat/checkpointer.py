@@ -0,0 +1,92 @@
+import os
+import time
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from app.chat import config
+from app.utils.async_loop import run_async
+from logger.logger import setup_logger
+
+logger = setup_logger(config.CHAT_LOG_PATH)
+
+
+class BoundedSqliteSaver(AsyncSqliteSaver):
+    """
+    SQLite checkpointer keeping only the latest checkpoints of each thread,
+    and dropping threads that have not been used for max_age seconds.
+    Only the latest checkpoint is needed to continue a conversation; the
+    older ones each hold a full copy of the message history.
+    """
+
+    def __init__(self, conn, max_checkpoints=config.CHAT_CHECKPOINTS_PER_THREAD, max_age=config.CHAT_THREAD_MAX_AGE):
+        super().__init__(conn)
+        self.max_checkpoints = max_checkpoints
+        self.max_age = max_age
+        self.is_activity_setup = False
+
+    async def setup(self):
+        # Called by the saver before every operation, the tables are only created once
+        await super().setup()
+        if self.is_activity_setup:
+            return
+        async with self.lock:
+            await self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS thread_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+            await self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS thread_activity_updated_at ON thread_activity (updated_at)"
+            )
+            await self.conn.commit()
+        self.is_activity_setup = True
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        await self.prune(str(config["configurable"]["thread_id"]))
+        return next_config
+
+    async def prune(self, thread_id):
+        """
+        Deletes the checkpoints of the thread beyond the latest max_checkpoints,
+        and the threads idle for longer than max_age.
+        """
+        async with self.lock:
+            # Checkpoint IDs are time ordered UUIDs
+            await self.conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_id NOT IN ("
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id DESC LIMIT ?)",
+                (thread_id, thread_id, self.max_checkpoints)
+            )
+            await self.conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_id NOT IN ("
+                "SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?)",
+                (thread_id, thread_id)
+            )
+            now = time.time()
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO thread_activity (thread_id, updated_at) VALUES (?, ?)", (thread_id, now)
+            )
+            async with self.conn.execute(
+                "SELECT thread_id FROM thread_activity WHERE updated_at < ?", (now - self.max_age, )
+            ) as cursor:
+                expired = [(row[0], ) for row in await cursor.fetchall()]
+            if expired:
+                await self.conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", expired)
+                await self.conn.executemany("DELETE FROM writes WHERE thread_id = ?", expired)
+                await self.conn.executemany("DELETE FROM thread_activity WHERE thread_id = ?", expired)
+                logger.info("Pruned %d idle chat threads", len(expired))
+            await self.conn.commit()
+
+
+def open_checkpointer(path=config.CHAT_CHECKPOINT_PATH):
+    """
+    Opens the SQLite checkpointer on the background loop, which every graph run uses.
+    """
+    async def _open():
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        saver = BoundedSqliteSaver(await aiosqlite.connect(path))
+        await saver.setup()
+        return saver
+
+    return run_async(_open())
@@ -0,0 +1,19 @@
+"""
+Config for the chat graph
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CHAT_LOG_PATH = os.getenv("CHAT_LOG_PATH", "logs/chat.log")
+CHAT_CHECKPOINT_PATH = os.getenv("CHAT_CHECKPOINT_PATH", "data/checkpoints.sqlite3")
+CHAT_CHECKPOINTS_PER_THREAD = int(os.getenv("CHAT_CHECKPOINTS_PER_THREAD", "10"))
+CHAT_THREAD_MAX_AGE = int(os.getenv("CHAT_THREAD_MAX_AGE", str(30 * 24 * 3600)))
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o")
+CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+CHAT_CONTEXT_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MAX_TOKENS", "12000"))
+CHAT_CONTEXT_KEEP_TOKENS = int(os.getenv("CHAT_CONTEXT_KEEP_TOKENS", "6000"))
+CHAT_TOOL_MESSAGE_MAX_TOKENS = int(os.getenv("CHAT_TOOL_MESSAGE_MAX_TOKENS", "2000"))
+CHAT_OLD_TOOL_MESSAGE_MAX_TOKENS = int(os.getenv("CHAT_OLD_TOOL_MESSAGE_MAX_TOKENS", "200"))
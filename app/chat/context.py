@@ -0,0 +1,158 @@
+from functools import lru_cache
+
+import tiktoken
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+from app.chat import config
+from logger.logger import setup_logger
+
+logger = setup_logger(config.CHAT_LOG_PATH)
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below between a user and their personal assistant, "
+    "extending the existing summary if there is one. Keep names, dates, email subjects, "
+    "decisions and open questions; drop pleasantries. Reply with the summary only."
+)
+
+# Tokens added per message by the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.encoding_for_model(config.CHAT_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+@lru_cache(maxsize=4096)
+def count_tokens(text):
+    """
+    Tokens of a text in the chat model's tokenizer; cached, as the same
+    messages are counted again on every turn.
+    """
+    return len(_encoding().encode(text, disallowed_special=()))
+
+
+def message_tokens(message):
+    """
+    Approximate tokens a message takes in a request: its content and tool calls.
+    """
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(content)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        tokens += count_tokens(f"{tool_call['name']}{tool_call['args']}")
+    return tokens
+
+
+def truncate_text(text, max_tokens):
+    """
+    The first max_tokens tokens of the text, noting how much was cut.
+    """
+    tokens = _encoding().encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding().decode(tokens[:max_tokens]) + f"\n...[truncated {len(tokens) - max_tokens} tokens]"
+
+
+def _last_human_index(messages):
+    for idx in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[idx], HumanMessage):
+            return idx
+    return 0
+
+
+def _truncate_tool_messages(messages):
+    """
+    Replacements for the tool messages over their budget: tool outputs of
+    the current turn keep CHAT_TOOL_MESSAGE_MAX_TOKENS, the ones of earlier
+    turns, already answered, only CHAT_OLD_TOOL_MESSAGE_MAX_TOKENS.
+    """
+    current_turn = _last_human_index(messages)
+    updates = []
+    for idx, message in enumerate(messages):
+        if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+            continue
+        max_tokens = config.CHAT_TOOL_MESSAGE_MAX_TOKENS if idx > current_turn else config.CHAT_OLD_TOOL_MESSAGE_MAX_TOKENS
+        content = truncate_text(message.content, max_tokens)
+        if content != message.content:
+            # Same ID, so add_messages replaces the message in the state
+            updates.append(message.model_copy(update={"content": content}))
+            messages[idx] = updates[-1]
+    return updates
+
+
+def _summary_cut(messages, keep_tokens):
+    """
+    Index of the earliest user message from which the rest of the conversation
+    fits in keep_tokens; everything before it is summarized. Cutting only before
+    user messages keeps tool calls together with their results, and the current
+    turn is never cut.
+    """
+    cut = 0
+    total = sum(message_tokens(message) for message in messages)
+    last_human = _last_human_index(messages)
+    for idx, message in enumerate(messages[:last_human + 1]):
+        if isinstance(message, HumanMessage) and (total <= keep_tokens or idx == last_human):
+            return idx
+        total -= message_tokens(message)
+        cut = idx + 1
+    return min(cut, last_human)
+
+
+def _transcript(messages):
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"User: {message.content}")
+        elif isinstance(message, AIMessage) and message.content:
+            lines.append(f"Assistant: {message.content}")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Tool {message.name}: {message.content}")
+    return "\n".join(lines)
+
+
+def make_context_node(summary_llm):
+    """
+    Graph node keeping the conversation under CHAT_CONTEXT_MAX_TOKENS: it
+    truncates long tool outputs and, once over budget, folds the oldest turns
+    into a running summary kept in the state, so each turn is only summarized once.
+    """
+    async def manage_context(state):
+        messages = list(state["messages"])
+        updates = _truncate_tool_messages(messages)
+
+        total = sum(message_tokens(message) for message in messages)
+        if total <= config.CHAT_CONTEXT_MAX_TOKENS:
+            return {"messages": updates} if updates else {}
+
+        cut = _summary_cut(messages, config.CHAT_CONTEXT_KEEP_TOKENS)
+        if cut == 0:
+            return {"messages": updates} if updates else {}
+
+        summary = state.get("summary", "")
+        prompt = f"Existing summary:\n{summary}\n\nConversation:\n{_transcript(messages[:cut])}" if summary \
+            else f"Conversation:\n{_transcript(messages[:cut])}"
+        response = await summary_llm.ainvoke([SystemMessage(SUMMARY_PROMPT), HumanMessage(prompt)])
+        logger.info(
+            "Summarized %d messages, context down from %d to %d tokens", cut, total,
+            sum(message_tokens(message) for message in messages[cut:])
+        )
+        removed = {message.id for message in messages[:cut]}
+        return {
+            "summary": response.content,
+            "messages": [update for update in updates if update.id not in removed]
+            + [RemoveMessage(id=message_id) for message_id in removed]
+        }
+
+    return manage_context
+
+
+def context_messages(state):
+    """
+    Messages sent to the chat model: the running summary, if any, then the recent conversation.
+    """
+    if state.get("summary"):
+        return [SystemMessage(f"Summary of the earlier conversation:\n{state['summary']}")] + state["messages"]
+    return state["messages"]
@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from typing import Annotated
+from typing_extensions import TypedDict
+
+from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
+from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.messages import SystemMessage
+from langchain_openai import ChatOpenAI
+from langchain_community.tools.tavily_search import TavilySearchResults
+
+from app.chat import config
+from app.chat.context import make_context_node, context_messages
+from integrations.google.gmail.tool import email_search_tool, email_fetch_tool
+from integrations.google.calendar.tool import calendar_event_create_tool
+
+
+# Tools with side effects, a turn calling them must not be answered again from a cache
+STATE_CHANGING_TOOLS = frozenset({calendar_event_create_tool.name})
+
+
+class State(TypedDict):
+    messages: Annotated[list, add_messages]
+    # Running summary of the turns dropped from messages
+    summary: str
+
+
+def build_graph(checkpointer=None):
+    """
+    Builds and compiles the chat graph, with its LLM client and tools.
+    Compiling is slow and the clients hold HTTP connection pools, so the
+    graph is built once per process and shared by every session.
+    """
+    search_tool = TavilySearchResults(max_results=2)
+    tools = [search_tool, email_search_tool, email_fetch_tool, calendar_event_create_tool]
+
+    llm = ChatOpenAI(model=config.CHAT_MODEL, temperature=0.4).bind_tools(tools)
+    summary_llm = ChatOpenAI(model=config.CHAT_SUMMARY_MODEL, temperature=0)
+
+    async def chatbot(state: State):
+        # Today's date lets the model turn "last week" into search date filters, which are in UTC
+        system_message = SystemMessage(f"Today is {datetime.now(timezone.utc):%A, %Y-%m-%d} (UTC).")
+        return {"messages": [await llm.ainvoke([system_message] + context_messages(state))]}
+
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("context", make_context_node(summary_llm))
+    graph_builder.add_node("tools", ToolNode(tools=tools))
+    graph_builder.add_node("chatbot", chatbot)
+
+    # Every call to the model goes through the context manager, after tools too
+    graph_builder.add_edge(START, "context")
+    graph_builder.add_edge("context", "chatbot")
+    graph_builder.add_edge("chatbot", END)
+    graph_builder.add_conditional_edges(
+        "chatbot",
+        tools_condition,
+    )
+    graph_builder.add_edge("tools", "context")
+
+    return graph_builder.compile(checkpointer=checkpointer if checkpointer is not None else MemorySaver())
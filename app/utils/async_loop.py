@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+_loop = None
+_lock = threading.Lock()
+
+
+def get_loop():
+    """
+    Returns the process-wide event loop, running on a daemon thread.
+    Async clients bind to the loop they are first used on, so every
+    coroutine is run on this one loop rather than a fresh asyncio.run loop.
+    """
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-loop", daemon=True).start()
+    return _loop
+
+
+def run_async(coro):
+    """
+    Runs a coroutine on the background loop and waits for its result.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result()
+
+
+def iterate_async(agen):
+    """
+    Iterates an async generator on the background loop from synchronous code.
+    """
+    loop = get_loop()
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
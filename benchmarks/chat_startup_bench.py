@@ -0,0 +1,75 @@
+"""
+Benchmark of chat turn latency with the graph rebuilt on every turn, as on
+every Streamlit rerun before it was cached, versus built once per process
+
+Usage: python -m benchmarks.chat_startup_bench [--turns N] [--question TEXT] [--user-id ID]
+
+Calls the OpenAI API, so it needs OPENAI_API_KEY and TAVILY_API_KEY.
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+from app.utils.async_loop import run_async
+
+
+async def measure_turn(graph, question, user_id):
+    """
+    Seconds to the first token of the answer, and to the end of the turn
+    """
+
+    config = {"configurable": {"thread_id": str(uuid.uuid4()), "user_id": user_id}}
+    start = time.perf_counter()
+    first_token = None
+    async for message, metadata in graph.astream({"messages": [("user", question)]}, config, stream_mode="messages"):
+        if first_token is None and metadata.get("langgraph_node") == "chatbot" and message.content:
+            first_token = time.perf_counter() - start
+    return first_token, time.perf_counter() - start
+
+
+def report(name, builds, first_tokens, totals):
+    print(
+        f"{name:<10} build {statistics.mean(builds) * 1000:8.1f} ms/turn"
+        f"   ttft median {statistics.median(first_tokens) * 1000:8.1f} ms"
+        f"   turn median {statistics.median(totals) * 1000:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chat graph startup and time to first token")
+    parser.add_argument("--turns", type=int, default=5, help="Chat turns per variant")
+    parser.add_argument("--question", default="Reply with a one sentence greeting.", help="Question asked every turn")
+    parser.add_argument("--user-id", type=int, default=0, help="User ID passed to the tools")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    from app.chat.graph import build_graph
+    print(f"Imported the chat graph module in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    # Before: every rerun rebuilt the clients, tools and graph
+    builds, first_tokens, totals = [], [], []
+    for _ in range(args.turns):
+        start = time.perf_counter()
+        graph = build_graph()
+        builds.append(time.perf_counter() - start)
+        first_token, total = run_async(measure_turn(graph, args.question, args.user_id))
+        first_tokens.append(builds[-1] + (first_token or total))
+        totals.append(builds[-1] + total)
+    report("per-rerun", builds, first_tokens, totals)
+
+    # After: one graph per process, warm HTTP connections
+    start = time.perf_counter()
+    graph = build_graph()
+    build = time.perf_counter() - start
+    first_tokens, totals = [], []
+    for _ in range(args.turns):
+        first_token, total = run_async(measure_turn(graph, args.question, args.user_id))
+        first_tokens.append(first_token or total)
+        totals.append(total)
+    report("cached", [build / args.turns], first_tokens, totals)
+
+
+if __name__ == "__main__":
+    main()
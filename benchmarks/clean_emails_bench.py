@@ -0,0 +1,141 @@
+"""
+Benchmark of clean_emails on a synthetic corpus of HTML and plain text emails
+
+Usage: python -m benchmarks.clean_emails_bench [--emails N] [--seed N]
+"""
+
+import argparse
+import html
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from bs4 import BeautifulSoup
+from dateutil import parser as date_parser
+
+from integrations.google.gmail import utils
+
+WORDS = (
+    "meeting invoice project deadline review update schedule report budget team client proposal "
+    "contract shipment order payment travel flight hotel agenda notes follow attached please thanks"
+).split()
+
+
+def _sentence(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+
+def _paragraphs(rng, count):
+    return [" ".join(_sentence(rng) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+
+def make_email(rng, idx, start):
+    """
+    A synthetic email shaped like the output of parse_email, without the parsed date
+    """
+
+    date = start + timedelta(minutes=idx * 7)
+    paragraphs = _paragraphs(rng, rng.randint(2, 12))
+    quoted = _paragraphs(rng, rng.randint(0, 20))
+    if rng.random() < 0.7:
+        html_body = (
+            "<html><head><style>p { margin: 0 } .x { color: red }</style></head><body>"
+            + "".join(f"<p>{html.escape(p)} &amp; more&nbsp;text</p>" for p in paragraphs)
+            + "<table>" + "".join(f"<tr><td>{rng.choice(WORDS)}</td><td>{rng.randint(1, 999)}</td></tr>" for _ in range(rng.randint(0, 15))) + "</table>"
+            + "<div>-- <br>Jane Doe<br>Example Corp</div>"
+            + (f'<div class="gmail_quote">On {format_datetime(date)} John wrote:<blockquote>'
+               + "".join(f"<p>{html.escape(p)}</p>" for p in quoted) + "</blockquote></div>" if quoted else "")
+            + "</body></html>"
+        )
+        body = ""
+    else:
+        html_body = ""
+        body = "\n\n".join(paragraphs) + "\n\n-- \nJane Doe\nExample Corp\n"
+        if quoted:
+            body += f"\nOn {format_datetime(date)} John wrote:\n" + "\n".join(f"> {p}" for p in quoted)
+    return {
+        "id": f"msg{idx}",
+        "threadId": f"thread{idx // 3}",
+        "labels": ["INBOX"],
+        "snippet": html.escape(paragraphs[0][:100]),
+        "headers": {
+            "From": "Jane Doe <jane@example.com>",
+            "To": "john@example.com",
+            "Subject": _sentence(rng),
+            "Date": format_datetime(date)
+        },
+        "body": body,
+        "html_body": html_body,
+        "attachments": []
+    }
+
+
+def make_corpus(count, seed):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [make_email(rng, idx, start) for idx in range(count)]
+
+
+def clean_emails_legacy(emails):
+    """
+    The previous implementation: BeautifulSoup with html.parser, unescaping
+    every body and parsing every date with dateutil
+    """
+
+    cleaned_emails = []
+    for email in emails:
+        headers = email.get("headers", {})
+        try:
+            date = date_parser.parse(headers.get("Date", ""))
+        except (ValueError, TypeError):
+            date = None
+        if email.get("html_body"):
+            body = html.unescape(BeautifulSoup(email["html_body"], "html.parser").get_text(separator="\n"))
+        else:
+            body = html.unescape(email.get("body", ""))
+        cleaned_emails.append({
+            "id": email.get("id"),
+            "snippet": html.unescape(email.get("snippet", "")),
+            "date": date,
+            "body": body
+        })
+    return cleaned_emails
+
+
+def run(name, func, emails):
+    start = time.perf_counter()
+    cleaned = func(emails)
+    elapsed = time.perf_counter() - start
+    chars = sum(len(email["body"]) for email in cleaned)
+    print(f"{name:<22} {elapsed:8.3f}s {len(emails) / elapsed:10.0f} emails/s {chars / len(emails):10.0f} body chars/email")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark clean_emails on a synthetic corpus")
+    parser.add_argument("--emails", type=int, default=5000, help="Number of emails in the corpus")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the corpus generator")
+    args = parser.parse_args()
+
+    # Both implementations parse the Date headers, so the timings compare the same work
+    corpus = make_corpus(args.emails, args.seed)
+
+    backends = [("bs4", utils._html_to_text_bs4)]
+    if utils.lxml_html is not None:
+        backends.append(("lxml", utils._html_to_text_lxml))
+    if utils.SelectolaxParser is not None:
+        backends.append(("selectolax", utils._html_to_text_selectolax))
+
+    print(f"{len(corpus)} emails, default backend: {utils._html_to_text.__name__}")
+    run("legacy", clean_emails_legacy, corpus)
+    default = utils._html_to_text
+    try:
+        for name, backend in backends:
+            utils._html_to_text = backend
+            run(f"clean_emails[{name}]", utils.clean_emails, corpus)
+    finally:
+        utils._html_to_text = default
+
+
+if __name__ == "__main__":
+    main()
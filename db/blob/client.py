@@ -0,0 +1,190 @@
+"""
+Implementation of the local Blob Store Client
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+from logger.logger import setup_logger
+from db.blob import config
+
+logger = setup_logger(config.BLOB_STORE_LOG_PATH)
+
+
+class BlobStoreClient:
+    """
+    SQLite backed store for full email bodies and extracted attachment texts
+    """
+
+    _instance = None
+    _connection = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton class implementation.
+        """
+
+        if not cls._instance:
+            cls._instance = super().__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self):
+        """
+        Opens the store and creates its tables if needed.
+        """
+
+        if not self._connection:
+            if os.path.dirname(config.BLOB_STORE_PATH):
+                os.makedirs(os.path.dirname(config.BLOB_STORE_PATH), exist_ok=True)
+            self._lock = threading.Lock()
+            self._connection = sqlite3.connect(config.BLOB_STORE_PATH, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS emails ("
+                "user_id INTEGER NOT NULL, email_id TEXT NOT NULL, email TEXT NOT NULL, "
+                "PRIMARY KEY (user_id, email_id))"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS attachment_texts ("
+                "user_id INTEGER NOT NULL, content_hash TEXT NOT NULL, text TEXT NOT NULL, "
+                "PRIMARY KEY (user_id, content_hash))"
+            )
+            self._connection.commit()
+            logger.info("Opened blob store at %s", config.BLOB_STORE_PATH)
+
+    def put_emails(self, user_id: int, emails: List[Dict[str, Any]]):
+        """
+        Stores cleaned emails, replacing any previous version.
+
+        :param user_id: User ID the emails belong to
+        :param emails: Cleaned emails; only the metadata of their attachments is stored
+        """
+
+        email_rows = []
+        for email in emails:
+            record = {key: value for key, value in email.items() if key not in ("attachments", "date")}
+            record["date"] = int(email["date"].timestamp()) if email.get("date") else None
+            record["attachments"] = [
+                {key: value for key, value in attachment.items() if key != "data"}
+                for attachment in email.get("attachments", [])
+            ]
+            email_rows.append((user_id, email["id"], json.dumps(record)))
+
+        with self._lock:
+            try:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO emails (user_id, email_id, email) VALUES (?, ?, ?)",
+                    email_rows
+                )
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                logger.error("Error storing emails: %s", str(e))
+                raise
+
+    def get_email(self, user_id: int, email_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetches a stored email with its full body and attachment metadata.
+
+        :param user_id: User ID the email belongs to
+        :param email_id: Gmail message ID
+        :return: The email as a dictionary, or None if it is not stored
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT email FROM emails WHERE user_id = ? AND email_id = ?", (user_id, email_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_attachment_texts(self, user_id: int, content_hashes: List[str]) -> Dict[str, str]:
+        """
+        Fetches the extracted texts of attachments already seen in other emails.
+
+        :param user_id: User ID the attachments belong to
+        :param content_hashes: SHA-256 hashes of the attachment contents
+        :return: Extracted texts by content hash, for the hashes that are stored
+        """
+
+        if not content_hashes:
+            return {}
+        texts = {}
+        with self._lock:
+            # Stay below SQLite's limit on the number of query parameters
+            for start in range(0, len(content_hashes), 500):
+                batch = content_hashes[start:start + 500]
+                rows = self._connection.execute(
+                    "SELECT content_hash, text FROM attachment_texts WHERE user_id = ? "
+                    f"AND content_hash IN ({', '.join('?' * len(batch))})",
+                    (user_id, *batch)
+                ).fetchall()
+                texts.update(rows)
+        return texts
+
+    def put_attachment_texts(self, user_id: int, texts: Dict[str, str]):
+        """
+        Stores extracted attachment texts, so identical attachments are only extracted once.
+
+        :param user_id: User ID the attachments belong to
+        :param texts: Extracted texts by content hash
+        """
+
+        if not texts:
+            return
+        with self._lock:
+            try:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO attachment_texts (user_id, content_hash, text) VALUES (?, ?, ?)",
+                    [(user_id, content_hash, text) for content_hash, text in texts.items()]
+                )
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                logger.error("Error storing attachment texts: %s", str(e))
+                raise
+
+    def update_labels(self, user_id: int, labels: Dict[str, List[str]]):
+        """
+        Replaces the labels of stored emails.
+
+        :param user_id: User ID the emails belong to
+        :param labels: Current labels by Gmail message ID
+        """
+
+        if not labels:
+            return
+        with self._lock:
+            try:
+                self._connection.executemany(
+                    "UPDATE emails SET email = json_set(email, '$.labels', json(?)) "
+                    "WHERE user_id = ? AND email_id = ?",
+                    [(json.dumps(email_labels), user_id, email_id) for email_id, email_labels in labels.items()]
+                )
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                logger.error("Error updating email labels: %s", str(e))
+                raise
+
+    def delete_emails(self, user_id: int, email_ids: List[str]):
+        """
+        Deletes stored emails.
+
+        :param user_id: User ID the emails belong to
+        :param email_ids: Gmail message IDs to delete
+        """
+
+        if not email_ids:
+            return
+        rows = [(user_id, email_id) for email_id in email_ids]
+        with self._lock:
+            try:
+                self._connection.executemany("DELETE FROM emails WHERE user_id = ? AND email_id = ?", rows)
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                logger.error("Error deleting emails: %s", str(e))
+                raise
@@ -0,0 +1,11 @@
+"""
+Config for the Blob Store Client
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BLOB_STORE_LOG_PATH = os.getenv("BLOB_STORE_LOG_PATH", "logs/blob_store.log")
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "data/blobs.sqlite3")
@@ -2,10 +2,15 @@
 Client class for MySQL connection
 """
 
+import threading
+import time
+import weakref
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple
 
-import mysql.connector
 from mysql.connector import Error
+from mysql.connector.pooling import MySQLConnectionPool
 
 from logger.logger import setup_logger
 from db.mysql import config
@@ -13,13 +18,38 @@ from db.mysql import config
 logger = setup_logger(config.MYSQL_CLIENT_LOG_PATH)
 
 
+@lru_cache(maxsize=256)
+def _insert_statement(table: str, columns: Tuple[str, ...]) -> str:
+    placeholders = ', '.join(['%s'] * len(columns))
+    column_list = ', '.join(f"`{col}`" for col in columns)
+    return f"INSERT INTO `{table}` ({column_list}) VALUES ({placeholders})"
+
+
+@lru_cache(maxsize=256)
+def _upsert_statement(table: str, columns: Tuple[str, ...], update_columns: Tuple[str, ...]) -> str:
+    assignments = ', '.join(f"`{col}` = new.`{col}`" for col in update_columns)
+    return f"{_insert_statement(table, columns)} AS new ON DUPLICATE KEY UPDATE {assignments}"
+
+
+@lru_cache(maxsize=256)
+def _update_statement(table: str, columns: Tuple[str, ...], where: str) -> str:
+    set_clause = ', '.join(f"`{col}` = %s" for col in columns)
+    return f"UPDATE `{table}` SET {set_clause} WHERE {where}"
+
+
+@lru_cache(maxsize=256)
+def _delete_statement(table: str, where: str) -> str:
+    return f"DELETE FROM `{table}` WHERE {where}"
+
+
 class MySQLClient:
     """
     Client class for MySQL connection
     """
 
     _instance = None
-    _connection = None
+    _pool = None
+    _pool_lock = None
 
     def __new__(cls, *args, **kwargs):
         """
@@ -32,31 +62,201 @@ class MySQLClient:
     
     def __init__(self):
         """
-        Initializes the MySQL Client with connection parameters.
+        Initializes the MySQL Client. The pool of connections is created on
+        first use, so importing a module that creates the client, e.g. in a
+        spawned process, opens no connections.
+        """
+
+        if not self._pool_lock:
+            self._pool_lock = threading.Lock()
+            # The pool raises when exhausted, so callers queue on the semaphore instead
+            self._available = threading.BoundedSemaphore(config.MYSQL_POOL_SIZE)
+            self._stats_lock = threading.Lock()
+            self._local = threading.local()
+            self._prepared = weakref.WeakKeyDictionary()
+            self._closing = False
+            self._stats = {
+                "pool_size": config.MYSQL_POOL_SIZE,
+                "in_use": 0,
+                "max_in_use": 0,
+                "checkouts": 0,
+                "wait_seconds": 0.0,
+                "reconnects": 0
+            }
+
+    def _get_pool(self) -> MySQLConnectionPool:
+        """
+        The pool of connections, created on first use.
+        """
+
+        with self._pool_lock:
+            if not self._pool:
+                try:
+                    self._pool = MySQLConnectionPool(
+                        pool_name=config.MYSQL_POOL_NAME,
+                        pool_size=config.MYSQL_POOL_SIZE,
+                        # Resetting the session would deallocate the cached prepared statements
+                        pool_reset_session=False,
+                        host=config.MYSQL_HOST,
+                        user=config.MYSQL_USER,
+                        password=config.MYSQL_PASSWORD,
+                        database=config.MYSQL_DB,
+                        port=config.MYSQL_PORT,
+                        autocommit=False
+                    )
+                    logger.info("Created MySQL connection pool of size %d.", config.MYSQL_POOL_SIZE)
+                except Error as e:
+                    logger.error("Error connecting to MySQL: %s", str(e))
+                    raise
+            return self._pool
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks a connection out of the pool for the duration of the block,
+        reconnecting it first if it has gone stale.
+
+        :return: A pooled connection, returned to the pool on exit.
+        """
+
+        start = time.monotonic()
+        if not self._available.acquire(timeout=config.MYSQL_POOL_TIMEOUT):
+            raise Error(msg="Timed out waiting for a MySQL connection from the pool")
+        waited = time.monotonic() - start
+
+        connection = None
+        try:
+            connection = self._get_pool().get_connection()
+            if not connection.is_connected():
+                connection.reconnect(attempts=3, delay=0.5)
+                # Prepared statements do not survive a reconnect
+                with self._stats_lock:
+                    self._prepared.pop(getattr(connection, "_cnx", connection), None)
+                    self._stats["reconnects"] += 1
+                logger.info("Reconnected stale MySQL connection.")
+            with self._stats_lock:
+                self._stats["checkouts"] += 1
+                self._stats["wait_seconds"] += waited
+                self._stats["in_use"] += 1
+                self._stats["max_in_use"] = max(self._stats["max_in_use"], self._stats["in_use"])
+            try:
+                yield connection
+            finally:
+                with self._stats_lock:
+                    self._stats["in_use"] -= 1
+        finally:
+            if connection is not None:
+                if self._closing:
+                    connection.disconnect()
+                connection.close()
+            self._available.release()
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Utilization metrics of the connection pool.
+
+        :return: Pool size, connections in use, peak usage, checkouts,
+            total seconds spent waiting for a connection and reconnects.
+        """
+
+        with self._stats_lock:
+            return dict(self._stats)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs every operation in the block, on this thread, in one transaction
+        that is committed once on exit and rolled back on error. Nested
+        transactions join the outer one.
+        """
+
+        if getattr(self._local, "connection", None) is not None:
+            yield
+            return
+
+        with self.connection() as connection:
+            self._local.connection = connection
+            try:
+                yield
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+            finally:
+                self._local.connection = None
+
+    def _prepared_cursor(self, connection, statement):
+        """
+        Returns the cached server-side prepared cursor of the statement on the
+        connection, preparing it on first use.
+        """
+
+        with self._stats_lock:
+            cursors = self._prepared.setdefault(getattr(connection, "_cnx", connection), {})
+            cursor = cursors.get(statement)
+            if cursor is None:
+                cursor = connection.cursor(prepared=True)
+                cursors[statement] = cursor
+        return cursor
+
+    @contextmanager
+    def _cursor(self, error_message, statement=None, **cursor_kwargs):
         """
+        Yields a cursor on the connection of the current transaction, or on a
+        connection checked out for this operation alone and committed on success.
 
-        if not self._connection or not self.connection.is_connected():
+        :param error_message: Message logged if the operation fails.
+        :param statement: If given, a cached prepared cursor for this statement is used.
+        :param cursor_kwargs: Arguments for a regular cursor.
+        """
+
+        in_transaction = getattr(self._local, "connection", None) is not None
+        with ExitStack() as stack:
+            connection = self._local.connection if in_transaction else stack.enter_context(self.connection())
+            if statement:
+                cursor = self._prepared_cursor(connection, statement)
+            else:
+                cursor = connection.cursor(**cursor_kwargs)
             try:
-                self.connection = mysql.connector.connect(
-                    host=config.MYSQL_HOST,
-                    user=config.MYSQL_USER,
-                    password=config.MYSQL_PASSWORD,
-                    database=config.MYSQL_DB,
-                    port=config.MYSQL_PORT,
-                    autocommit=False
-                )
-                if self.connection.is_connected():
-                    logger.info("Successfully connected to the database.")
-            except Error as e:
-                logger.error("Error connecting to MySQL: %s", str(e))
+                yield cursor
+                if not in_transaction:
+                    connection.commit()
+            except BaseException as e:
+                if not in_transaction:
+                    connection.rollback()
+                if isinstance(e, Error):
+                    logger.error("%s: %s", error_message, str(e))
                 raise
+            finally:
+                if not statement:
+                    cursor.close()
 
     def close(self):
-        """Closes the connection to the MySQL database."""
+        """
+        Closes the connections of the pool, waiting up to MYSQL_POOL_TIMEOUT
+        for the checked out ones to be returned. Connections still checked out
+        after that, or checked out later, are closed when they are returned.
+        """
 
-        if self.connection and self.connection.is_connected():
-            self.connection.close()
-            logger.info("MySQL connection closed.")
+        if not self._pool:
+            return
+        self._closing = True
+        # Holding a slot of the semaphore means one connection is idle in the pool
+        acquired = 0
+        for _ in range(config.MYSQL_POOL_SIZE):
+            if not self._available.acquire(timeout=config.MYSQL_POOL_TIMEOUT):
+                break
+            acquired += 1
+        try:
+            for connection in [self._get_pool().get_connection() for _ in range(acquired)]:
+                connection.disconnect()
+                connection.close()
+        finally:
+            for _ in range(acquired):
+                self._available.release()
+        with self._stats_lock:
+            in_use = self._stats["in_use"]
+        logger.info("MySQL connection pool closed, %d connections still in use.", in_use)
 
     def execute_query(
         self, query: str, params: Optional[Tuple[Any, ...]] = None
@@ -69,21 +269,11 @@ class MySQLClient:
         :return: A list of dictionaries representing rows, or None for non-SELECT queries.
         """
 
-        cursor = self.connection.cursor(dictionary=True)
-        try:
+        with self._cursor("Error executing query", dictionary=True) as cursor:
             cursor.execute(query, params)
             if cursor.with_rows:
-                result = cursor.fetchall()
-                return result
-            else:
-                self.connection.commit()
-                return None
-        except Error as e:
-            self.connection.rollback()
-            logger.error("Error executing query: %s", str(e))
-            raise
-        finally:
-            cursor.close()
+                return cursor.fetchall()
+            return None
 
     def insert(
         self, table: str, data: Dict[str, Any]
@@ -95,24 +285,64 @@ class MySQLClient:
         :param data: A dictionary of column names and their corresponding values.
         :return: The ID of the inserted row.
         """
-        columns = ', '.join(f"`{col}`" for col in data.keys())
-        placeholders = ', '.join(['%s'] * len(data))
-        values = tuple(data.values())
-
-        query = f"INSERT INTO `{table}` ({columns}) VALUES ({placeholders})"
-        cursor = self.connection.cursor()
-        try:
-            cursor.execute(query, values)
-            self.connection.commit()
+        query = _insert_statement(table, tuple(data.keys()))
+        with self._cursor("Error inserting record", statement=query) as cursor:
+            cursor.execute(query, tuple(data.values()))
             inserted_id = cursor.lastrowid
-            logger.info("Inserted record with ID: %s", str(inserted_id))
-            return inserted_id
-        except Error as e:
-            self.connection.rollback()
-            logger.error("Error inserting record: %s", str(e))
-            raise
-        finally:
-            cursor.close()
+        logger.info("Inserted record with ID: %s", str(inserted_id))
+        return inserted_id
+
+    def insert_many(
+        self, table: str, rows: List[Dict[str, Any]], batch_size: int = config.MYSQL_BATCH_SIZE
+    ) -> int:
+        """
+        Inserts several records into a table with multi-row INSERT statements.
+
+        :param table: The table name.
+        :param rows: Dictionaries of column names and values, all with the same columns.
+        :param batch_size: Maximum number of rows per statement.
+        :return: The number of rows inserted.
+        """
+        if not rows:
+            return 0
+        columns = tuple(rows[0].keys())
+        query = _insert_statement(table, columns)
+        affected = 0
+        with self._cursor("Error inserting records") as cursor:
+            for start in range(0, len(rows), batch_size):
+                cursor.executemany(query, [tuple(row[col] for col in columns) for row in rows[start:start + batch_size]])
+                affected += cursor.rowcount
+        logger.info("Inserted %s records.", str(affected))
+        return affected
+
+    def upsert_many(
+        self,
+        table: str,
+        rows: List[Dict[str, Any]],
+        update_columns: Optional[List[str]] = None,
+        batch_size: int = config.MYSQL_BATCH_SIZE
+    ) -> int:
+        """
+        Inserts several records into a table, updating the rows that already
+        exist with multi-row INSERT ... ON DUPLICATE KEY UPDATE statements.
+
+        :param table: The table name.
+        :param rows: Dictionaries of column names and values, all with the same columns.
+        :param update_columns: Columns to overwrite on duplicate keys, default is all columns.
+        :param batch_size: Maximum number of rows per statement.
+        :return: The number of rows affected, as reported by MySQL.
+        """
+        if not rows:
+            return 0
+        columns = tuple(rows[0].keys())
+        query = _upsert_statement(table, columns, tuple(update_columns or columns))
+        affected = 0
+        with self._cursor("Error upserting records") as cursor:
+            for start in range(0, len(rows), batch_size):
+                cursor.executemany(query, [tuple(row[col] for col in columns) for row in rows[start:start + batch_size]])
+                affected += cursor.rowcount
+        logger.info("Upserted %s records.", str(affected))
+        return affected
 
     def update(
         self, table: str, data: Dict[str, Any], where: str, params: Tuple[Any, ...]
@@ -126,23 +356,12 @@ class MySQLClient:
         :param params: Parameters to pass to the WHERE clause.
         :return: The number of rows affected.
         """
-        set_clause = ', '.join(f"`{col}` = %s" for col in data.keys())
-        values = tuple(data.values()) + params
-
-        query = f"UPDATE `{table}` SET {set_clause} WHERE {where}"
-        cursor = self.connection.cursor()
-        try:
-            cursor.execute(query, values)
-            self.connection.commit()
+        query = _update_statement(table, tuple(data.keys()), where)
+        with self._cursor("Error updating records", statement=query) as cursor:
+            cursor.execute(query, tuple(data.values()) + params)
             affected = cursor.rowcount
-            logger.info("Updated %s records.", str(affected))
-            return affected
-        except Error as e:
-            self.connection.rollback()
-            logger.error("Error updating records: %s", str(e))
-            raise
-        finally:
-            cursor.close()
+        logger.info("Updated %s records.", str(affected))
+        return affected
 
     def delete(
         self, table: str, where: str, params: Tuple[Any, ...]
@@ -155,17 +374,9 @@ class MySQLClient:
         :param params: Parameters to pass to the WHERE clause.
         :return: The number of rows affected.
         """
-        query = f"DELETE FROM `{table}` WHERE {where}"
-        cursor = self.connection.cursor()
-        try:
+        query = _delete_statement(table, where)
+        with self._cursor("Error deleting records", statement=query) as cursor:
             cursor.execute(query, params)
-            self.connection.commit()
             affected = cursor.rowcount
-            logger.info("Deleted %s records.", str(affected))
-            return affected
-        except Error as e:
-            self.connection.rollback()
-            logger.error("Error deleting records: %s", str(e))
-            raise
-        finally:
-            cursor.close()
+        logger.info("Deleted %s records.", str(affected))
+        return affected
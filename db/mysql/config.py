@@ -13,3 +13,7 @@ MYSQL_USER = os.getenv("MYSQL_USER", "root")
 MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD", "")
 MYSQL_DB = os.getenv("MYSQL_DB", "personalisedai")
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3307")
+MYSQL_POOL_NAME = os.getenv("MYSQL_POOL_NAME", "personalisedai")
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "8"))
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "30"))
+MYSQL_BATCH_SIZE = int(os.getenv("MYSQL_BATCH_SIZE", "1000"))
@@ -0,0 +1,4 @@
+-- Resumable sync checkpoints, for databases created before queries.sql declared them
+ALTER TABLE gmail_integration
+    ADD COLUMN sync_page_token VARCHAR(255) NULL,
+    ADD COLUMN sync_newest_at TIMESTAMP NULL;
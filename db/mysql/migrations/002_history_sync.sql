@@ -0,0 +1,4 @@
+-- History API sync, for databases created before queries.sql declared the columns
+ALTER TABLE gmail_integration
+    ADD COLUMN history_id VARCHAR(32) NULL,
+    ADD COLUMN sync_history_id VARCHAR(32) NULL;
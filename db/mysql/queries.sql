@@ -11,5 +11,26 @@ CREATE TABLE gmail_integration (
     id INT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL UNIQUE,
     last_sync_at TIMESTAMP DEFAULT '1970-01-01 00:00:01',
+    history_id VARCHAR(32) NULL,
+    sync_page_token VARCHAR(255) NULL,
+    sync_newest_at TIMESTAMP NULL,
+    sync_history_id VARCHAR(32) NULL,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
+
+CREATE TABLE sync_jobs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    status VARCHAR(16) NOT NULL DEFAULT 'queued',
+    progress INT NOT NULL DEFAULT 0,
+    error TEXT NULL,
+    worker VARCHAR(100) NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL,
+    heartbeat_at TIMESTAMP NULL,
+    finished_at TIMESTAMP NULL,
+    INDEX (status, created_at),
+    INDEX (user_id, status),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
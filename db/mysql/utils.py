@@ -15,8 +15,9 @@ def validate_login(username, password):
 def register(username, password, email):
     try:
         password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-        id = client.insert("users", {"username": username, "password_hash": password_hash, "email": email, "user_role": "user"})
-        client.insert("gmail_integration", {"user_id": id})
+        with client.transaction():
+            id = client.insert("users", {"username": username, "password_hash": password_hash, "email": email, "user_role": "user"})
+            client.insert("gmail_integration", {"user_id": id})
         return id
     except Exception as e:
         raise RuntimeError("Unable to register")
@@ -33,3 +34,158 @@ def update_last_sync_at(user_id, last_sync_at):
         client.update("gmail_integration", {"last_sync_at": datetime.fromtimestamp(last_sync_at)}, "`user_id` = %s", (user_id, ))
     except Exception as e:
         raise RuntimeError("Unable to update gmail last sync at")
+
+def get_history_id(user_id):
+    try:
+        rows = client.execute_query("SELECT history_id FROM gmail_integration WHERE user_id = %s", (user_id, ))
+        return rows[0]["history_id"]
+    except Exception as e:
+        raise RuntimeError("Unable to fetch gmail history id")
+
+def get_sync_checkpoint(user_id):
+    try:
+        rows = client.execute_query(
+            "SELECT sync_page_token, sync_newest_at, sync_history_id FROM gmail_integration WHERE user_id = %s",
+            (user_id, )
+        )
+        newest_at = rows[0]["sync_newest_at"]
+        return (
+            rows[0]["sync_page_token"],
+            int(newest_at.timestamp()) if newest_at else None,
+            rows[0]["sync_history_id"]
+        )
+    except Exception as e:
+        raise RuntimeError("Unable to fetch gmail sync checkpoint")
+
+def update_sync_checkpoint(user_id, page_token, newest_at, history_id):
+    try:
+        client.update(
+            "gmail_integration",
+            {
+                "sync_page_token": page_token,
+                "sync_newest_at": datetime.fromtimestamp(newest_at),
+                "sync_history_id": history_id
+            },
+            "`user_id` = %s",
+            (user_id, )
+        )
+    except Exception as e:
+        raise RuntimeError("Unable to update gmail sync checkpoint")
+
+def complete_sync(user_id, last_sync_at, history_id):
+    try:
+        client.update(
+            "gmail_integration",
+            {
+                "last_sync_at": datetime.fromtimestamp(last_sync_at),
+                "history_id": history_id,
+                "sync_page_token": None,
+                "sync_newest_at": None,
+                "sync_history_id": None
+            },
+            "`user_id` = %s",
+            (user_id, )
+        )
+    except Exception as e:
+        raise RuntimeError("Unable to complete gmail sync")
+
+def enqueue_sync_job(user_id):
+    try:
+        with client.transaction():
+            # Lock the user's integration row so concurrent enqueues do not both insert
+            client.execute_query("SELECT id FROM gmail_integration WHERE user_id = %s FOR UPDATE", (user_id, ))
+            pending = client.execute_query(
+                "SELECT id FROM sync_jobs WHERE user_id = %s AND status IN ('queued', 'running')", (user_id, )
+            )
+            if pending:
+                return pending[0]["id"]
+            return client.insert("sync_jobs", {"user_id": user_id})
+    except Exception as e:
+        raise RuntimeError("Unable to enqueue gmail sync job")
+
+def claim_sync_job(worker, shard=None):
+    try:
+        # shard is (index, count): only claim jobs of users with user_id % count == index
+        shard_clause = "AND MOD(j.user_id, %s) = %s " if shard else ""
+        with client.transaction():
+            # A user's jobs share one sync checkpoint, so they never run concurrently
+            rows = client.execute_query(
+                "SELECT j.id, j.user_id FROM sync_jobs j WHERE j.status = 'queued' "
+                "AND NOT EXISTS (SELECT 1 FROM sync_jobs r WHERE r.user_id = j.user_id AND r.status = 'running') "
+                + shard_clause +
+                "ORDER BY j.created_at LIMIT 1 FOR UPDATE SKIP LOCKED",
+                (shard[1], shard[0]) if shard else None
+            )
+            if not rows:
+                return None
+            # Job times are set by MySQL, the clock requeue_stale_sync_jobs compares them with
+            client.execute_query(
+                "UPDATE sync_jobs SET status = 'running', worker = %s, started_at = NOW(), heartbeat_at = NOW() "
+                "WHERE id = %s",
+                (worker, rows[0]["id"])
+            )
+            return rows[0]
+    except Exception as e:
+        raise RuntimeError("Unable to claim gmail sync job")
+
+# Job updates only apply while the worker still owns the job, not after it was requeued to another worker
+OWNED_JOB_CLAUSE = "`id` = %s AND `worker` = %s AND `status` = 'running'"
+
+def heartbeat_sync_job(job_id, worker):
+    try:
+        client.execute_query(
+            "UPDATE sync_jobs SET heartbeat_at = NOW() WHERE " + OWNED_JOB_CLAUSE, (job_id, worker)
+        )
+        rows = client.execute_query(
+            "SELECT id FROM sync_jobs WHERE id = %s AND worker = %s AND status = 'running'", (job_id, worker)
+        )
+        return bool(rows)
+    except Exception as e:
+        raise RuntimeError("Unable to update gmail sync job heartbeat")
+
+def update_sync_job_progress(job_id, worker, progress):
+    try:
+        client.execute_query(
+            "UPDATE sync_jobs SET progress = %s, heartbeat_at = NOW() WHERE " + OWNED_JOB_CLAUSE,
+            (progress, job_id, worker)
+        )
+    except Exception as e:
+        raise RuntimeError("Unable to update gmail sync job progress")
+
+def finish_sync_job(job_id, worker, error=None):
+    try:
+        client.execute_query(
+            "UPDATE sync_jobs SET status = %s, error = %s, finished_at = NOW() WHERE " + OWNED_JOB_CLAUSE,
+            ("failed" if error else "done", error, job_id, worker)
+        )
+    except Exception as e:
+        raise RuntimeError("Unable to finish gmail sync job")
+
+def requeue_stale_sync_jobs(stale_after):
+    try:
+        client.execute_query(
+            "UPDATE sync_jobs SET status = 'queued', worker = NULL "
+            "WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND",
+            (stale_after, )
+        )
+    except Exception as e:
+        raise RuntimeError("Unable to requeue stale gmail sync jobs")
+
+def get_latest_sync_job(user_id):
+    try:
+        rows = client.execute_query(
+            "SELECT * FROM sync_jobs WHERE user_id = %s ORDER BY id DESC LIMIT 1", (user_id, )
+        )
+        return rows[0] if rows else None
+    except Exception as e:
+        raise RuntimeError("Unable to fetch gmail sync job")
+
+def get_connected_user_ids():
+    try:
+        rows = client.execute_query(
+            "SELECT user_id FROM gmail_integration "
+            "WHERE history_id IS NOT NULL OR last_sync_at > '1970-01-01 00:00:01'"
+        )
+        return [row["user_id"] for row in rows]
+    except Exception as e:
+        raise RuntimeError("Unable to fetch connected gmail users")
@@ -0,0 +1,87 @@
+"""
+Implementation of the async Qdrant Vector DB Client
+"""
+
+from qdrant_client import AsyncQdrantClient
+
+from db.qdrant import config
+from db.qdrant.client import QdrantDBClient
+
+
+class AsyncQdrantDBClient:
+    """
+    Async Qdrant Vector DB Client, for searches from async tools.
+    Must only be used from a single event loop (see app.utils.async_loop).
+    """
+
+    _instance = None
+    _client = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton class implementation.
+        """
+
+        if not cls._instance:
+            cls._instance = super().__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self):
+        """
+        Initialise an async Qdrant Client.
+        """
+
+        if not self._client:
+            self._client = AsyncQdrantClient(url=f"http://{config.QDRANT_HOST}:{config.QDRANT_PORT}")
+            self._layouts = {}
+
+    async def _layout(self, collection_name):
+        """
+        Layout of the collection, fetched once per collection, see QdrantDBClient._collection_layout.
+        """
+
+        if collection_name not in self._layouts:
+            info = await self._client.get_collection(collection_name)
+            self._layouts[collection_name] = QdrantDBClient._collection_layout(info)
+        return self._layouts[collection_name]
+
+    async def search(self, user_id, collection_name, query_vector, limit=10, group_by=None, query_text=None, filters=None):
+        """
+        Search the collection for the user_id and the query vector
+
+        :param user_id: User ID, used to check the correct partition in the collection
+        :param collection_name: Name of the collection to search
+        :param query_vector: Embedding vector for the query
+        :param limit (optional): Number of points to retrieve from the db
+        :param group_by (optional): Payload field to collapse hits on, e.g. "email_id"
+            to return only the best matching chunk of each email
+        :param query_text (optional): Text of the query, for a hybrid dense and
+            sparse search on hybrid collections
+        :param filters (optional): Payload conditions by field, e.g.
+            {"date": {"gte": 1700000000}, "labels": ["INBOX"]}, narrowing the
+            candidates before the vector search
+
+        :return records: Top matching records
+        """
+
+        query = QdrantDBClient._query(
+            user_id, query_vector, query_text, limit, filters, await self._layout(collection_name)
+        )
+
+        if group_by:
+            groups = await self._client.query_points_groups(
+                collection_name=collection_name,
+                group_by=group_by,
+                group_size=1,
+                limit=limit,
+                **query
+            )
+            return [group.hits[0] for group in groups.groups]
+
+        records = await self._client.query_points(
+            collection_name=collection_name,
+            limit=limit,
+            **query
+        )
+
+        return records
@@ -8,6 +8,11 @@ from qdrant_client import QdrantClient
 from qdrant_client import models
 
 from db.qdrant import config
+from db.qdrant.sparse import encode_document, encode_query
+
+# Names of the dense and sparse vectors of hybrid collections
+DENSE_VECTOR = "dense"
+SPARSE_VECTOR = "bm25"
 
 
 class QdrantDBClient:
@@ -34,10 +39,14 @@ class QdrantDBClient:
 
         if not self._client:
             self._client = QdrantClient(url=f"http://{config.QDRANT_HOST}:{config.QDRANT_PORT}")
+            self._layouts = {}
 
     def _create_index_for_collection(self, collection_name):
         """
-        Index the collection for individual users.
+        Index the collection for individual users, for the parent record
+        of chunked points, and for the fields searches filter on.
+        Creating an index that already exists is a no-op, so this can be
+        re-run on existing collections.
 
         :param collection_name: Name of the collection to create payload index for
         """
@@ -50,56 +59,374 @@ class QdrantDBClient:
                 is_tenant=True
             )
         )
+        self._client.create_payload_index(
+            collection_name=collection_name,
+            field_name="email_id",
+            field_schema=models.KeywordIndexParams(type="keyword")
+        )
+        self._client.create_payload_index(
+            collection_name=collection_name,
+            field_name="date",
+            field_schema=models.IntegerIndexParams(type="integer", range=True, lookup=False)
+        )
+        for field_name in ("from_address", "labels", "thread_id", "source"):
+            self._client.create_payload_index(
+                collection_name=collection_name,
+                field_name=field_name,
+                field_schema=models.KeywordIndexParams(type="keyword")
+            )
+        # Full-text index, to match a sender by name
+        self._client.create_payload_index(
+            collection_name=collection_name,
+            field_name="from",
+            field_schema=models.TextIndexParams(
+                type="text",
+                tokenizer=models.TokenizerType.WORD,
+                lowercase=True
+            )
+        )
 
-    def create_collection(self, collection_name, size=1536, distance=models.Distance.DOT):
+    @staticmethod
+    def _quantization_config(quantization):
+        """
+        Quantization config for the collection, with the quantized vectors kept in RAM.
+
+        :param quantization: "scalar" (int8), "binary" or "none"
+        """
+
+        if quantization == "scalar":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True
+                )
+            )
+        if quantization == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+        if quantization == "none":
+            return None
+        raise ValueError(f"Unknown quantization: {quantization}")
+
+    @staticmethod
+    def _collection_layout(info):
+        """
+        How the points of a collection are stored, read from its config, so
+        queries match the collection rather than the current environment.
+
+        :param info: CollectionInfo of the collection
+
+        :return layout: Dictionary with hybrid, whether points have named dense
+            and sparse vectors, and quantized, whether the vectors are quantized
+        """
+
+        quantization = info.config.quantization_config
+        vectors = info.config.params.vectors
+        hybrid = isinstance(vectors, dict) and DENSE_VECTOR in vectors
+        if hybrid:
+            vectors = vectors[DENSE_VECTOR]
+        if isinstance(vectors, models.VectorParams) and vectors.quantization_config:
+            quantization = vectors.quantization_config
+        return {"hybrid": hybrid, "quantized": quantization is not None}
+
+    def _layout(self, collection_name):
+        """
+        Layout of the collection, fetched once per collection.
+        """
+
+        if collection_name not in self._layouts:
+            self._layouts[collection_name] = self._collection_layout(self._client.get_collection(collection_name))
+        return self._layouts[collection_name]
+
+    @staticmethod
+    def _search_params(quantized):
+        """
+        Search params rescoring quantized candidates with the original vectors.
+
+        :param quantized: Whether the collection's vectors are quantized
+        """
+
+        if not quantized:
+            return None
+        return models.SearchParams(
+            quantization=models.QuantizationSearchParams(
+                rescore=config.QDRANT_RESCORE,
+                oversampling=config.QDRANT_OVERSAMPLING
+            )
+        )
+
+    def create_collection(
+        self,
+        collection_name,
+        size=config.QDRANT_VECTOR_SIZE,
+        distance=models.Distance.DOT,
+        quantization=config.QDRANT_QUANTIZATION,
+        on_disk=config.QDRANT_ON_DISK_VECTORS,
+        on_disk_hnsw=config.QDRANT_ON_DISK_HNSW,
+        on_disk_payload=config.QDRANT_ON_DISK_PAYLOAD,
+        hybrid=config.QDRANT_HYBRID
+    ):
         """
         Creates a collection, and indexes it for user_id
         
         :param collection_name: Name of the collection to create
-        :param size (optional): Size of the embedding vectors,
-            default is 1536 (OpenAI's text-embedding-3-small)
+        :param size (optional): Size of the embedding vectors, default is
+            QDRANT_VECTOR_SIZE, which follows OPENAI_EMBEDDING_DIMENSIONS and
+            is 1536 (OpenAI's text-embedding-3-small) when neither is set
         :param distance (optional): Distance metric to use, default is dot product
+        :param quantization (optional): "scalar", "binary" or "none"; quantized
+            vectors stay in RAM and searches rescore with the original vectors
+        :param on_disk (optional): Whether to keep the original vectors on disk
+        :param on_disk_hnsw (optional): Whether to keep the HNSW index on disk
+        :param on_disk_payload (optional): Whether to keep payloads on disk
+        :param hybrid (optional): Whether to store named dense and BM25 sparse
+            vectors for hybrid search, instead of a single unnamed dense vector.
+            Inserts and searches follow the collection's layout
         """
 
         try:
+            vectors_config = models.VectorParams(size=size, distance=distance, on_disk=on_disk)
+            sparse_vectors_config = None
+            if hybrid:
+                vectors_config = {DENSE_VECTOR: vectors_config}
+                # Qdrant applies the IDF of each term at query time
+                sparse_vectors_config = {
+                    SPARSE_VECTOR: models.SparseVectorParams(
+                        index=models.SparseIndexParams(on_disk=on_disk),
+                        modifier=models.Modifier.IDF
+                    )
+                }
             # Create a collection
             self._client.create_collection(
                 collection_name=collection_name,
-                vectors_config=models.VectorParams(size=size, distance=distance),
-                hnsw_config=models.HnswConfigDiff(payload_m=42, m=0)
+                vectors_config=vectors_config,
+                sparse_vectors_config=sparse_vectors_config,
+                hnsw_config=models.HnswConfigDiff(payload_m=42, m=0, on_disk=on_disk_hnsw),
+                quantization_config=self._quantization_config(quantization),
+                on_disk_payload=on_disk_payload
             )
+            self._layouts.pop(collection_name, None)
             self._create_index_for_collection(collection_name=collection_name)
         except Exception as e:
             raise e
 
-    def insert_data(self, user_id, collection_name, data, data_vector, wait=True):
+    @staticmethod
+    def _field_condition(field, value):
+        """
+        Condition on a payload field: a list matches any of its values, a dict
+        with gte/gt/lte/lt bounds a numeric range, a dict with text does a
+        full-text match, anything else matches exactly.
+        """
+
+        if isinstance(value, (list, tuple, set)):
+            return models.FieldCondition(key=field, match=models.MatchAny(any=list(value)))
+        if isinstance(value, dict) and "text" in value:
+            return models.FieldCondition(key=field, match=models.MatchText(text=value["text"]))
+        if isinstance(value, dict):
+            return models.FieldCondition(key=field, range=models.Range(**value))
+        return models.FieldCondition(key=field, match=models.MatchValue(value=value))
+
+    @staticmethod
+    def _user_filter(user_id, filters=None):
+        """
+        Filter restricting a query to the user's partition of the collection.
+
+        :param user_id: User ID to restrict to
+        :param filters (optional): Payload conditions by field, see _field_condition
+        """
+
+        return models.Filter(
+            must=[
+                models.FieldCondition(key="user_id", match=models.MatchValue(value=user_id)),
+                *(QdrantDBClient._field_condition(field, value) for field, value in (filters or {}).items())
+            ]
+        )
+
+    @staticmethod
+    def point_id(user_id, key):
         """
-        Insert the data into the collection
+        Deterministic point ID for a record, so re-inserting the same record
+        overwrites the existing point instead of creating a duplicate.
+
+        :param user_id: User ID the record belongs to
+        :param key: Source identifier of the record (e.g. the Gmail message ID)
+
+        :return point_id: UUID string derived from (user_id, key)
+        """
+
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}/{key}"))
+
+    @staticmethod
+    def point_vector(data_vector, text=None, hybrid=False):
+        """
+        Vectors of a point: the dense vector, plus the BM25 sparse vector of
+        the text for hybrid collections.
+
+        :param data_vector: The embedding vector for the data
+        :param text (optional): Text the sparse vector is computed from
+        :param hybrid (optional): Whether the collection is hybrid, see _collection_layout
+        """
+
+        if not hybrid:
+            return data_vector
+        vectors = {DENSE_VECTOR: data_vector}
+        if text:
+            vectors[SPARSE_VECTOR] = encode_document(text)
+        return vectors
+
+    @staticmethod
+    def _query(user_id, query_vector, query_text, limit, filters=None, layout=None):
+        """
+        Arguments of a query for the user_id: a dense search, or, for hybrid
+        collections queried with a text, a dense and a sparse search fused
+        with reciprocal rank fusion in the same request.
+
+        :param user_id: User ID to restrict the query to
+        :param query_vector: Embedding vector for the query
+        :param query_text: Text of the query, or None for a dense search
+        :param limit: Number of points to retrieve
+        :param filters: Payload conditions by field, see _field_condition
+        :param layout: Layout of the collection, see _collection_layout
+        """
+
+        layout = layout or {}
+        query_filter = QdrantDBClient._user_filter(user_id, filters)
+        search_params = QdrantDBClient._search_params(layout.get("quantized", False))
+        if not layout.get("hybrid", False):
+            return {"query": query_vector, "query_filter": query_filter, "search_params": search_params}
+        if not query_text:
+            return {
+                "query": query_vector,
+                "using": DENSE_VECTOR,
+                "query_filter": query_filter,
+                "search_params": search_params
+            }
+
+        prefetch_limit = limit * config.QDRANT_HYBRID_PREFETCH
+        return {
+            "prefetch": [
+                models.Prefetch(
+                    query=query_vector,
+                    using=DENSE_VECTOR,
+                    filter=query_filter,
+                    params=search_params,
+                    limit=prefetch_limit
+                ),
+                models.Prefetch(
+                    query=encode_query(query_text),
+                    using=SPARSE_VECTOR,
+                    filter=query_filter,
+                    limit=prefetch_limit
+                )
+            ],
+            "query": models.FusionQuery(fusion=models.Fusion.RRF),
+            "query_filter": query_filter
+        }
+
+    def insert_many(
+        self,
+        user_id,
+        collection_name,
+        records,
+        batch_size=config.QDRANT_UPSERT_BATCH_SIZE,
+        parallel=config.QDRANT_UPSERT_PARALLEL,
+        wait=True
+    ):
+        """
+        Bulk insert data into the collection
 
         :param user_id: User ID, used to partition the collection
         :param collection_name: Name of the collection to insert data into
-        :param data: The data to add as payload
-        :param data_vector: The embedding vector for the data
+        :param records: Iterable of (key, payload, data_vector) or
+            (key, payload, data_vector, text) tuples, where key identifies the
+            record at its source and determines the point ID, payload is a
+            dictionary of payload fields, and text, if given, is indexed for
+            the sparse search of hybrid collections
+        :param batch_size (optional): Number of points sent per upsert request
+        :param parallel (optional): Number of upsert requests run in parallel
         :param wait (optional): Whether the client should wait for insert to complete
         """
 
         try:
-            point_id = str(uuid.uuid4())
-            self._client.upsert(
+            hybrid = self._layout(collection_name)["hybrid"]
+            points = (
+                models.PointStruct(
+                    id=self.point_id(user_id, record[0]),
+                    payload={**record[1], "user_id": user_id},
+                    vector=self.point_vector(record[2], record[3] if len(record) > 3 else None, hybrid)
+                )
+                for record in records
+            )
+            self._client.upload_points(
+                collection_name=collection_name,
+                points=points,
+                batch_size=batch_size,
+                parallel=parallel,
+                wait=wait
+            )
+        except Exception as e:
+            raise e
+
+    def delete_by_field(self, user_id, collection_name, field, values, keep_keys=None, wait=True):
+        """
+        Delete the user's points whose payload field matches any of the values
+
+        :param user_id: User ID, used to partition the collection
+        :param collection_name: Name of the collection to delete data from
+        :param field: Payload field to match on (e.g. "email_id")
+        :param values: Values of the field to delete
+        :param keep_keys (optional): Source identifiers of records inserted with
+            insert_many whose points are kept even if they match
+        :param wait (optional): Whether the client should wait for delete to complete
+        """
+
+        if not values:
+            return
+        try:
+            self._client.delete(
                 collection_name=collection_name,
-                points=[
-                    models.PointStruct(
-                        id=point_id,
-                        payload={"user_id": user_id, "data": data},
-                        vector=data_vector
+                points_selector=models.FilterSelector(
+                    filter=models.Filter(
+                        must=[
+                            models.FieldCondition(key="user_id", match=models.MatchValue(value=user_id)),
+                            models.FieldCondition(key=field, match=models.MatchAny(any=list(values)))
+                        ],
+                        must_not=[
+                            models.HasIdCondition(has_id=[self.point_id(user_id, key) for key in keep_keys])
+                        ] if keep_keys else None
                     )
-                ],
+                ),
+                wait=wait
+            )
+        except Exception as e:
+            raise e
+
+    def set_payload_by_field(self, user_id, collection_name, field, value, payload, wait=True):
+        """
+        Update payload fields of the user's points whose payload field equals the value,
+        leaving their vectors and other payload fields as they are
+
+        :param user_id: User ID, used to partition the collection
+        :param collection_name: Name of the collection to update
+        :param field: Payload field to match on (e.g. "email_id")
+        :param value: Value of the field to update
+        :param payload: Payload fields to set
+        :param wait (optional): Whether the client should wait for the update to complete
+        """
+
+        try:
+            self._client.set_payload(
+                collection_name=collection_name,
+                payload=payload,
+                points=models.FilterSelector(filter=self._user_filter(user_id, {field: value})),
                 wait=wait
             )
         except Exception as e:
             raise e
 
-    def search(self, user_id, collection_name, query_vector, limit=10):
+    def search(self, user_id, collection_name, query_vector, limit=10, group_by=None, query_text=None, filters=None):
         """
         Search the collection for the user_id and the query vector
         
@@ -107,19 +434,33 @@ class QdrantDBClient:
         :param collection_name: Name of the collection to search
         :param query_vector: Embedding vector for the query
         :param limit (optional): Number of points to retrieve from the db
+        :param group_by (optional): Payload field to collapse hits on, e.g. "email_id"
+            to return only the best matching chunk of each email
+        :param query_text (optional): Text of the query, for a hybrid dense and
+            sparse search on hybrid collections
+        :param filters (optional): Payload conditions by field, e.g.
+            {"date": {"gte": 1700000000}, "labels": ["INBOX"]}, narrowing the
+            candidates before the vector search
 
         :return records: Top matching records 
         """
 
+        query = self._query(user_id, query_vector, query_text, limit, filters, self._layout(collection_name))
+
+        if group_by:
+            groups = self._client.query_points_groups(
+                collection_name=collection_name,
+                group_by=group_by,
+                group_size=1,
+                limit=limit,
+                **query
+            )
+            return [group.hits[0] for group in groups.groups]
+
         records = self._client.query_points(
             collection_name=collection_name,
-            query=query_vector,
-            query_filter=models.Filter(
-                must=[
-                    models.FieldCondition(key="user_id", match=models.MatchValue(value=user_id))
-                ]
-            ),
-            limit=limit
+            limit=limit,
+            **query
         )
 
         return records
@@ -10,3 +10,18 @@ load_dotenv()
 QDRANT_CLIENT_LOG_PATH = os.getenv("QDRANT_CLIENT_LOG_PATH", "logs/qdrant_client.log")
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = os.getenv("QDRANT_PORT", "6333")
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "64"))
+QDRANT_UPSERT_PARALLEL = int(os.getenv("QDRANT_UPSERT_PARALLEL", "1"))
+# Defaults to the embedding dimensions setting, or the 1536 of text-embedding-3-small when unset
+QDRANT_VECTOR_SIZE = int(os.getenv("QDRANT_VECTOR_SIZE") or os.getenv("OPENAI_EMBEDDING_DIMENSIONS") or "1536")
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")
+QDRANT_ON_DISK_VECTORS = os.getenv("QDRANT_ON_DISK_VECTORS", "false").lower() == "true"
+QDRANT_ON_DISK_HNSW = os.getenv("QDRANT_ON_DISK_HNSW", "false").lower() == "true"
+QDRANT_ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "false").lower() == "true"
+QDRANT_RESCORE = os.getenv("QDRANT_RESCORE", "true").lower() == "true"
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+QDRANT_HYBRID = os.getenv("QDRANT_HYBRID", "true").lower() == "true"
+QDRANT_HYBRID_PREFETCH = int(os.getenv("QDRANT_HYBRID_PREFETCH", "5"))
+QDRANT_BM25_K1 = float(os.getenv("QDRANT_BM25_K1", "1.2"))
+QDRANT_BM25_B = float(os.getenv("QDRANT_BM25_B", "0.75"))
+QDRANT_BM25_AVG_LENGTH = float(os.getenv("QDRANT_BM25_AVG_LENGTH", "256"))
@@ -0,0 +1,78 @@
+"""
+BM25-style sparse vectors for hybrid search, computed locally
+
+Documents get the BM25 term-frequency weight of each term, queries a weight
+of 1 per term; the collection's IDF modifier makes Qdrant apply the inverse
+document frequency at query time, so their dot product is the BM25 score.
+"""
+
+import hashlib
+import re
+from collections import Counter
+
+from qdrant_client import models
+
+from db.qdrant import config
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its me my of on or so that the "
+    "this to was we were will with you your re fw fwd".split()
+)
+
+
+def _term_index(term):
+    """
+    Stable 32-bit index of a term; Python's hash() is salted per process.
+    """
+
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def tokenize(text):
+    """
+    Lowercased word and number tokens of the text, without stopwords.
+    Identifiers like "INV-2024-0042" or "alice@example.com" are split into their parts.
+    """
+
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _sparse_vector(weights):
+    # Distinct terms can collide on an index, their weights are added up
+    merged = Counter()
+    for term, weight in weights.items():
+        merged[_term_index(term)] += weight
+    return models.SparseVector(indices=list(merged.keys()), values=list(merged.values()))
+
+
+def encode_document(text, k1=config.QDRANT_BM25_K1, b=config.QDRANT_BM25_B, avg_length=config.QDRANT_BM25_AVG_LENGTH):
+    """
+    Sparse vector of a document, weighting each term by its saturated,
+    length-normalized BM25 term frequency.
+
+    :param text: Text of the document
+    :param k1 (optional): Term frequency saturation
+    :param b (optional): Length normalization strength
+    :param avg_length (optional): Average document length in tokens
+
+    :return vector: The sparse vector, empty if the text has no terms
+    """
+
+    counts = Counter(tokenize(text))
+    length = sum(counts.values())
+    norm = k1 * (1 - b + b * length / avg_length)
+    return _sparse_vector({term: count * (k1 + 1) / (count + norm) for term, count in counts.items()})
+
+
+def encode_query(text):
+    """
+    Sparse vector of a query, every distinct term weighted 1.
+
+    :param text: Text of the query
+
+    :return vector: The sparse vector, empty if the query has no terms
+    """
+
+    return _sparse_vector({term: 1.0 for term in set(tokenize(text))})
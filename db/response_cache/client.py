@@ -0,0 +1,192 @@
+"""
+Implementation of the semantic Response Cache Client
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from logger.logger import setup_logger
+from db.response_cache import config
+
+logger = setup_logger(config.RESPONSE_CACHE_LOG_PATH)
+
+# Questions whose answer changes with the current date, e.g. "what meetings do I have today"
+TIME_RELATIVE_PATTERN = re.compile(
+    r"\b(now|today|tonight|tomorrow|yesterday|recent(ly)?|latest|newest|upcoming|currently"
+    r"|(this|next|last|past|coming) (morning|afternoon|evening|night|week|weekend|month|quarter|year|\d+ \w+)"
+    r"|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b",
+    re.IGNORECASE
+)
+
+
+def is_time_relative(query: str) -> bool:
+    """
+    Whether the answer to a question depends on when it is asked, so it must not be cached.
+    """
+
+    return bool(TIME_RELATIVE_PATTERN.search(query))
+
+
+class ResponseCacheClient:
+    """
+    SQLite backed cache of assistant answers, looked up by the similarity of
+    the question's embedding to the embeddings of earlier questions of the
+    same user. OpenAI embeddings are normalized, so the dot product is the
+    cosine similarity.
+    """
+
+    _instance = None
+    _connection = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton class implementation.
+        """
+
+        if not cls._instance:
+            cls._instance = super().__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self):
+        """
+        Opens the cache and creates its tables if needed.
+        """
+
+        if not self._connection:
+            if os.path.dirname(config.RESPONSE_CACHE_PATH):
+                os.makedirs(os.path.dirname(config.RESPONSE_CACHE_PATH), exist_ok=True)
+            self._lock = threading.Lock()
+            self._connection = sqlite3.connect(config.RESPONSE_CACHE_PATH, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, query TEXT NOT NULL, "
+                "embedding BLOB NOT NULL, response TEXT NOT NULL, latency REAL NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_user_created_at ON responses (user_id, created_at)"
+            )
+            # Shared by every process using the cache, e.g. the chat app and the sync workers
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL NOT NULL)"
+            )
+            self._connection.commit()
+            logger.info("Opened response cache at %s", config.RESPONSE_CACHE_PATH)
+
+    def _increment(self, **counters):
+        self._connection.executemany(
+            "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            list(counters.items())
+        )
+
+    def lookup(self, user_id: int, embedding: List[float], threshold: float = config.RESPONSE_CACHE_THRESHOLD) -> Optional[Dict[str, Any]]:
+        """
+        Finds the cached answer to the most similar earlier question of the user.
+
+        :param user_id: User ID the question is asked by
+        :param embedding: Embedding of the question
+        :param threshold: Minimum cosine similarity for a hit
+        :return: Dictionary with query, response, similarity and saved_seconds, or None on a miss
+        """
+
+        start = time.perf_counter()
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT query, embedding, response, latency FROM responses WHERE user_id = ? AND created_at > ?",
+                (user_id, time.time() - config.RESPONSE_CACHE_TTL)
+            ).fetchall()
+            hit = None
+            if rows:
+                matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32).reshape(len(rows), -1)
+                similarities = matrix @ np.asarray(embedding, dtype=np.float32)
+                best = int(np.argmax(similarities))
+                if similarities[best] >= threshold:
+                    hit = {
+                        "query": rows[best][0],
+                        "response": rows[best][2],
+                        "similarity": float(similarities[best]),
+                        "saved_seconds": max(0.0, rows[best][3] - (time.perf_counter() - start))
+                    }
+            if hit:
+                self._increment(hits=1, saved_seconds=hit["saved_seconds"])
+            else:
+                self._increment(misses=1)
+            self._connection.commit()
+        stats = self.stats()
+        logger.info(
+            "Response cache %s for user %s (similarity %.3f); hit rate %.1f%% of %d lookups, %.1fs saved",
+            "hit" if hit else "miss", str(user_id), hit["similarity"] if hit else 0.0,
+            100 * stats["hit_rate"], stats["hits"] + stats["misses"], stats["saved_seconds"]
+        )
+        return hit
+
+    def put(self, user_id: int, query: str, embedding: List[float], response: str, latency: float):
+        """
+        Caches the answer to a question, keeping the user's most recent entries only.
+
+        :param user_id: User ID the question was asked by
+        :param query: The question
+        :param embedding: Embedding of the question
+        :param response: The assistant's answer
+        :param latency: Seconds it took to answer, saved by every hit on this entry
+        """
+
+        with self._lock:
+            try:
+                self._connection.execute(
+                    "INSERT INTO responses (user_id, query, embedding, response, latency, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, query, np.asarray(embedding, dtype=np.float32).tobytes(), response, latency, time.time())
+                )
+                self._connection.execute(
+                    "DELETE FROM responses WHERE user_id = ? AND (created_at <= ? OR id NOT IN ("
+                    "SELECT id FROM responses WHERE user_id = ? ORDER BY created_at DESC LIMIT ?))",
+                    (user_id, time.time() - config.RESPONSE_CACHE_TTL, user_id, config.RESPONSE_CACHE_MAX_ENTRIES_PER_USER)
+                )
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                logger.error("Error caching response: %s", str(e))
+
+    def invalidate(self, user_id: int):
+        """
+        Drops the user's cached answers, e.g. after new emails were synced.
+
+        :param user_id: User ID whose answers to drop
+        """
+
+        with self._lock:
+            try:
+                deleted = self._connection.execute("DELETE FROM responses WHERE user_id = ?", (user_id, )).rowcount
+                self._increment(invalidations=1)
+                self._connection.commit()
+            except sqlite3.Error as e:
+                self._connection.rollback()
+                logger.error("Error invalidating responses: %s", str(e))
+                raise
+        if deleted:
+            logger.info("Invalidated %d cached responses of user %s", deleted, str(user_id))
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit rate and saved latency of the cache, across all processes.
+
+        :return: Dictionary with hits, misses, hit_rate, saved_seconds and invalidations
+        """
+
+        with self._lock:
+            stats = dict(self._connection.execute("SELECT name, value FROM stats").fetchall())
+        hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+        return {
+            "hits": int(hits),
+            "misses": int(misses),
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "saved_seconds": stats.get("saved_seconds", 0.0),
+            "invalidations": int(stats.get("invalidations", 0))
+        }
@@ -0,0 +1,15 @@
+"""
+Config for the semantic Response Cache Client
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RESPONSE_CACHE_LOG_PATH = os.getenv("RESPONSE_CACHE_LOG_PATH", "logs/response_cache.log")
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "data/response_cache.sqlite3")
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES_PER_USER = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES_PER_USER", "500"))
@@ -1,3 +1,4 @@
+import asyncio
 from typing import List, Optional
 
 from langchain_core.tools import tool
@@ -7,7 +8,7 @@ from integrations.google.calendar.auth import authenticate_google_calendar
 from integrations.google.calendar.service import create_event
 
 @tool(parse_docstring=True)
-def calendar_event_create_tool(
+async def calendar_event_create_tool(
     summary: str,
     start_datetime: str,
     end_datetime: str,
@@ -34,8 +35,9 @@ def calendar_event_create_tool(
 
     try:
         user_id = config.get("configurable", {}).get("user_id")
-        service = authenticate_google_calendar(user_id)
-        return create_event(
+        service = await asyncio.to_thread(authenticate_google_calendar, user_id)
+        return await asyncio.to_thread(
+            create_event,
             service, 
             summary, 
             start_datetime, 
@@ -46,5 +48,5 @@ def calendar_event_create_tool(
             end_timezone,
             attendees
         )
-    except BaseException as e:
+    except Exception as e:
         return f"Failed to execute. Error: {repr(e)}"
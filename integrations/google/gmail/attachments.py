@@ -0,0 +1,225 @@
+"""
+Text extraction from email attachments
+
+Extraction runs in a pool of spawned worker processes, each attachment with
+a time limit, so a malformed or huge document cannot stall the sync. This
+module is loaded by the workers, so it only imports the document libraries
+it needs, on first use.
+"""
+
+import codecs
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from integrations.google.gmail.config import (
+    GMAIL_LOG_FILE,
+    GMAIL_ATTACHMENT_PROCESSES,
+    GMAIL_ATTACHMENT_TIMEOUT,
+    GMAIL_ATTACHMENT_MAX_CHARS
+)
+from logger.logger import setup_logger
+
+logger = setup_logger(GMAIL_LOG_FILE)
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+# Attachment kinds we extract text from, by content type, and by extension
+# for attachments sent as application/octet-stream
+CONTENT_TYPE_KINDS = {
+    "application/pdf": "pdf",
+    DOCX_CONTENT_TYPE: "docx",
+    "text/plain": "text",
+    "text/csv": "text",
+    "text/markdown": "text"
+}
+EXTENSION_KINDS = {
+    ".pdf": "pdf",
+    ".docx": "docx",
+    ".txt": "text",
+    ".csv": "text",
+    ".md": "text"
+}
+
+# Pool shared by the sync threads, and the number of extract_texts calls using each live pool
+_pool = None
+_pool_users = {}
+_pool_lock = threading.Lock()
+
+def attachment_kind(content_type: str, filename: Optional[str]) -> Optional[str]:
+    """
+    Kind of extractor for an attachment.
+
+    :param content_type: MIME type of the attachment
+    :param filename: File name of the attachment, if any
+    :return: "pdf", "docx" or "text", or None if no text can be extracted from it
+    """
+
+    kind = CONTENT_TYPE_KINDS.get(content_type)
+    if kind is None and filename:
+        kind = EXTENSION_KINDS.get(os.path.splitext(filename)[1].lower())
+    return kind
+
+def content_hash(data) -> str:
+    """
+    SHA-256 of attachment content, identifying identical attachments across emails.
+    """
+
+    return hashlib.sha256(memoryview(data)).hexdigest()
+
+def _extract_pdf(data, deadline, max_chars):
+    from pypdf import PdfReader
+
+    texts = []
+    length = 0
+    for page in PdfReader(io.BytesIO(data)).pages:
+        if time.monotonic() > deadline or length >= max_chars:
+            break
+        text = page.extract_text() or ""
+        texts.append(text)
+        length += len(text)
+    return "\n".join(texts)
+
+def _extract_docx(data, deadline, max_chars):
+    from docx import Document
+
+    document = Document(io.BytesIO(data))
+    texts = []
+    length = 0
+    blocks = [paragraph.text for paragraph in document.paragraphs]
+    for table in document.tables:
+        blocks.extend(" | ".join(cell.text for cell in row.cells) for row in table.rows)
+    for text in blocks:
+        if time.monotonic() > deadline or length >= max_chars:
+            break
+        texts.append(text)
+        length += len(text)
+    return "\n".join(texts)
+
+def _extract_text(data, deadline, max_chars):
+    truncated = len(data) > max_chars * 4
+    data = bytes(data[:max_chars * 4])
+    try:
+        # Not final when truncated, so a character cut in half at the end is dropped instead of failing the decode
+        return codecs.getincrementaldecoder("utf-8-sig")().decode(data, final=not truncated)
+    except UnicodeDecodeError:
+        return data.decode("cp1252", errors="replace")
+
+EXTRACTORS = {
+    "pdf": _extract_pdf,
+    "docx": _extract_docx,
+    "text": _extract_text
+}
+
+def extract_text(kind: str, data: bytes, timeout: float = GMAIL_ATTACHMENT_TIMEOUT, max_chars: int = GMAIL_ATTACHMENT_MAX_CHARS) -> str:
+    """
+    Extract the text of an attachment, stopping early once timeout seconds
+    have passed or max_chars characters were extracted.
+
+    :param kind: Kind of the attachment, see attachment_kind
+    :param data: Content of the attachment
+    :param timeout: Seconds after which extraction stops with the text found so far
+    :param max_chars: Maximum number of characters returned
+    :return: The extracted text, without blank lines
+    """
+
+    text = EXTRACTORS[kind](data, time.monotonic() + timeout, max_chars)
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())[:max_chars]
+
+def _extract_safe(kind, data, timeout, max_chars):
+    """
+    extract_text for the extraction pool, logging failures instead of raising them.
+    """
+
+    try:
+        return extract_text(kind, data, timeout, max_chars)
+    except Exception as e:
+        logger.error("An error occurred while extracting %s attachment text: %s", kind, repr(e))
+        return None
+
+@contextmanager
+def _extraction_pool():
+    """
+    Check out the shared extraction pool for the duration of a call. A pool
+    retired by _retire_extraction_pool is terminated when its last user returns it.
+    """
+
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = multiprocessing.get_context("spawn").Pool(processes=GMAIL_ATTACHMENT_PROCESSES)
+            _pool_users[_pool] = 0
+        pool = _pool
+        _pool_users[pool] += 1
+    try:
+        yield pool
+    finally:
+        with _pool_lock:
+            _pool_users[pool] -= 1
+            if pool is not _pool and not _pool_users[pool]:
+                del _pool_users[pool]
+                pool.terminate()
+
+def _retire_extraction_pool(pool):
+    """
+    Stop handing out the pool, e.g. when an extraction overran its time limit and
+    is stuck in a native call. Calls still using it keep it until they are done.
+    """
+
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+def extract_texts(
+    attachments: Dict[str, tuple],
+    timeout: float = GMAIL_ATTACHMENT_TIMEOUT,
+    max_chars: int = GMAIL_ATTACHMENT_MAX_CHARS
+) -> Dict[str, str]:
+    """
+    Extract the text of several attachments in parallel on the extraction pool.
+
+    :param attachments: (kind, data) tuples by content hash
+    :param timeout: Seconds each attachment may take
+    :param max_chars: Maximum number of characters per attachment
+    :return: Extracted texts by content hash; attachments that failed or timed out are left out
+    """
+
+    if not attachments:
+        return {}
+    if GMAIL_ATTACHMENT_PROCESSES <= 0:
+        results = {key: _extract_safe(kind, data, timeout, max_chars) for key, (kind, data) in attachments.items()}
+        return {key: text for key, text in results.items() if text is not None}
+
+    texts = {}
+    # A round that times out restarts the pool, the attachments it did not finish are retried once
+    for _ in range(2):
+        with _extraction_pool() as pool:
+            pending = {
+                key: pool.apply_async(_extract_safe, (kind, data, timeout, max_chars))
+                for key, (kind, data) in attachments.items()
+            }
+            # The workers stop extracting on their own after timeout, the grace period covers a slow page or paragraph
+            deadline = time.monotonic() + timeout * max(1, len(pending) / GMAIL_ATTACHMENT_PROCESSES) + timeout
+            timed_out = None
+            for key, result in pending.items():
+                result.wait(max(0.0, deadline - time.monotonic()))
+                if not result.ready():
+                    timed_out = key
+                    break
+            finished = {key: result.get() for key, result in pending.items() if result.ready()}
+            if timed_out is not None:
+                logger.error("Attachment %s timed out, restarting the extraction pool", timed_out)
+                _retire_extraction_pool(pool)
+        texts.update((key, text) for key, text in finished.items() if text is not None)
+        if timed_out is None:
+            break
+        attachments = {key: value for key, value in attachments.items() if key not in finished and key != timed_out}
+        if not attachments:
+            break
+    return texts
@@ -17,9 +17,12 @@ from logger.logger import setup_logger
 
 logger = setup_logger(GMAIL_LOG_FILE)
 
-def authenticate_gmail(user_id: int):
+def authenticate_gmail(user_id: int, interactive: bool = True):
     """
     Authenticate the user and return the Gmail service object.
+
+    :param interactive: Whether to run the OAuth flow when there are no stored
+        credentials; background workers pass False and fail instead
     """
 
     scopes = ["https://www.googleapis.com/auth/gmail.readonly"]
@@ -40,6 +43,9 @@ def authenticate_gmail(user_id: int):
                 logger.info("Refreshed expired credentials")
             except Exception as e:
                 logger.error("Error refreshing credentials: %s", str(e))
+        elif not interactive:
+            logger.error("No stored Gmail credentials for user %s", str(user_id))
+            raise RuntimeError("Gmail is not connected")
         else:
             try:
                 flow = InstalledAppFlow.from_client_secrets_file(GMAIL_CREDENTIALS, scopes)
@@ -12,3 +12,18 @@ load_dotenv()
 GMAIL_CREDENTIALS = os.getenv("GMAIL_CREDENTIALS_PATH", ".creds/credentials.json")
 GMAIL_TOKEN_PATH = os.getenv("GMAIL_TOKEN_PATH", ".creds/")
 GMAIL_LOG_FILE = os.getenv("GMAIL_LOG_FILE_PATH", "logs/gmail_connector.log")
+GMAIL_FETCH_MODE = os.getenv("GMAIL_FETCH_MODE", "batch")
+GMAIL_FETCH_BATCH_SIZE = int(os.getenv("GMAIL_FETCH_BATCH_SIZE", "50"))
+GMAIL_SYNC_PAGE_SIZE = int(os.getenv("GMAIL_SYNC_PAGE_SIZE", "100"))
+GMAIL_SYNC_MODE = os.getenv("GMAIL_SYNC_MODE", "history")
+GMAIL_CHUNK_TOKENS = int(os.getenv("GMAIL_CHUNK_TOKENS", "512"))
+GMAIL_CHUNK_OVERLAP_TOKENS = int(os.getenv("GMAIL_CHUNK_OVERLAP_TOKENS", "64"))
+GMAIL_PAYLOAD_SNIPPET_CHARS = int(os.getenv("GMAIL_PAYLOAD_SNIPPET_CHARS", "600"))
+GMAIL_STRIP_BOILERPLATE = os.getenv("GMAIL_STRIP_BOILERPLATE", "true").lower() == "true"
+# 0 parses inline; a pool pays off for a single worker process with large pages of big emails
+GMAIL_PARSE_PROCESSES = int(os.getenv("GMAIL_PARSE_PROCESSES", "0"))
+GMAIL_ATTACHMENT_INDEXING = os.getenv("GMAIL_ATTACHMENT_INDEXING", "true").lower() == "true"
+GMAIL_ATTACHMENT_MAX_BYTES = int(os.getenv("GMAIL_ATTACHMENT_MAX_BYTES", str(10 * 1024 * 1024)))
+GMAIL_ATTACHMENT_MAX_CHARS = int(os.getenv("GMAIL_ATTACHMENT_MAX_CHARS", "200000"))
+GMAIL_ATTACHMENT_TIMEOUT = float(os.getenv("GMAIL_ATTACHMENT_TIMEOUT", "30"))
+GMAIL_ATTACHMENT_PROCESSES = int(os.getenv("GMAIL_ATTACHMENT_PROCESSES", "2"))
@@ -2,56 +2,185 @@
 Methods to interact with Gmail API
 """
 
-import base64
-from email import policy
-from email.parser import BytesParser
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-from integrations.google.gmail.utils import robust_request
-from integrations.google.gmail.config import GMAIL_LOG_FILE
+from googleapiclient.errors import HttpError
+
+from integrations.google.gmail.utils import robust_request, RETRYABLE_STATUSES
+from integrations.google.gmail.parser import parse_email, parse_email_safe
+from integrations.google.gmail.config import (
+    GMAIL_LOG_FILE,
+    GMAIL_FETCH_BATCH_SIZE,
+    GMAIL_PARSE_PROCESSES,
+    GMAIL_ATTACHMENT_INDEXING,
+    GMAIL_ATTACHMENT_MAX_BYTES
+)
 from logger.logger import setup_logger
 
 logger = setup_logger(GMAIL_LOG_FILE)
 
-def list_emails(service, user_id="me", query="", max_results=100):
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+# Content of attachments up to this size is kept for text extraction
+ATTACHMENT_DATA_MAX_BYTES = GMAIL_ATTACHMENT_MAX_BYTES if GMAIL_ATTACHMENT_INDEXING else 0
+
+def iter_email_pages(service, user_id="me", query="", page_size=100, page_token=None):
     """
-    List email IDs matching the query.
+    Iterate over pages of email IDs matching the query, following pagination
+    until the listing is exhausted.
     
     :param service: Authenticated Gmail service object
     :param user_id: User"s email address. "me" refers to the authenticated user
     :param query: Gmail search query (e.g., "is:unread", "from:someone@example.com")
-    :param max_results: Maximum number of emails to retrieve
-    :return: List of email IDs
+    :param page_size: Number of email IDs per page
+    :param page_token: Page token to resume the listing from, if any
+    :return: Generator of (email IDs, next page token) tuples; the token is None on the last page
     """
 
-    try:
-        response = robust_request(
-            lambda: service.users()
-                .messages()
-                .list(userId=user_id, q=query, maxResults=max_results)
-                .execute()
-        )
-        messages = []
-        if "messages" in response:
-            messages.extend(response["messages"])
-
-        # Handle pagination if necessary
-        while "nextPageToken" in response and len(messages) < max_results:
-            page_token = response["nextPageToken"]
+    while True:
+        try:
             response = robust_request(
                 lambda: service.users()
                     .messages()
-                    .list(userId=user_id, q=query, pageToken=page_token, maxResults=max_results)
-                    .execute()
-                )
-            if "messages" in response:
-                messages.extend(response["messages"])
-            logger.info("Retrieved %d emails so far", len(messages))
+                    .list(userId=user_id, q=query, pageToken=page_token, maxResults=page_size)
+                    .execute(),
+                quota_units=5
+            )
+        except HttpError as e:
+            if page_token and e.resp.status in (400, 404):
+                # Stale page token, restart the listing from the first page
+                logger.warning("Page token rejected, restarting listing: %s", str(e))
+                page_token = None
+                continue
+            raise
 
-        logger.info("Total emails retrieved: %d", len(messages))
-        return messages[:max_results]
-    except Exception as e:
-        logger.error("An error occurred while listing emails: %s", str(e))
-        return []
+        page_token = response.get("nextPageToken")
+        messages = response.get("messages", [])
+        logger.info("Retrieved page of %d emails", len(messages))
+        yield messages, page_token
+        if not page_token:
+            return
+
+class HistoryExpiredError(Exception):
+    """
+    Raised when the start history ID is too old for Gmail to return changes since it.
+    """
+
+def get_history_id(service, user_id="me"):
+    """
+    Fetch the current history ID of the mailbox.
+    
+    :param service: Authenticated Gmail service object
+    :param user_id: User"s email address. "me" refers to the authenticated user
+    :return: The mailbox history ID
+    """
+
+    profile = robust_request(
+        lambda: service.users().getProfile(userId=user_id).execute(),
+        quota_units=1
+    )
+    return profile["historyId"]
+
+def list_history_changes(service, start_history_id, user_id="me", page_size=500):
+    """
+    List the emails added, changed and deleted since the given history ID.
+    
+    :param service: Authenticated Gmail service object
+    :param start_history_id: History ID to list changes since
+    :param user_id: User"s email address. "me" refers to the authenticated user
+    :param page_size: Number of history records per page
+    :return: Tuple of (IDs of emails to fetch, IDs of deleted emails,
+        current labels by ID of the emails whose labels alone changed, latest history ID)
+    """
+
+    changed = {}
+    labels = {}
+    page_token = None
+    while True:
+        try:
+            response = robust_request(
+                lambda: service.users()
+                    .history()
+                    .list(
+                        userId=user_id,
+                        startHistoryId=start_history_id,
+                        historyTypes=["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"],
+                        pageToken=page_token,
+                        maxResults=page_size
+                    )
+                    .execute(),
+                quota_units=2
+            )
+        except HttpError as e:
+            if e.resp.status == 404:
+                raise HistoryExpiredError(str(e)) from e
+            raise
+
+        # Records are in chronological order, so the last change to a message wins
+        for record in response.get("history", []):
+            for change in record.get("messagesAdded", []):
+                if changed.get(change["message"]["id"]) != "deleted":
+                    changed[change["message"]["id"]] = "added"
+            # A label change (read, archived, starred...) only updates the labels, the email is not refetched
+            for change in record.get("labelsAdded", []) + record.get("labelsRemoved", []):
+                msg_id = change["message"]["id"]
+                if changed.get(msg_id) in ("added", "deleted"):
+                    continue
+                if "labelIds" in change["message"]:
+                    changed[msg_id] = "labels"
+                    labels[msg_id] = change["message"]["labelIds"]
+                else:
+                    changed[msg_id] = "added"
+            for change in record.get("messagesDeleted", []):
+                changed[change["message"]["id"]] = "deleted"
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+
+    added = [msg_id for msg_id, change in changed.items() if change == "added"]
+    deleted = [msg_id for msg_id, change in changed.items() if change == "deleted"]
+    labels = {msg_id: labels[msg_id] for msg_id, change in changed.items() if change == "labels"}
+    logger.info(
+        "History since %s: %d added, %d deleted, %d relabeled",
+        str(start_history_id), len(added), len(deleted), len(labels)
+    )
+    return added, deleted, labels, response["historyId"]
+
+def _parse_pool():
+    """
+    Process pool parsing raw messages, created on first use; None if parsing runs inline
+    """
+
+    global _parse_executor
+    if GMAIL_PARSE_PROCESSES <= 0:
+        return None
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            # Spawned, as forking a process with running threads is unsafe
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=GMAIL_PARSE_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _parse_executor
+
+def parse_emails(messages):
+    """
+    Parse raw Gmail message resources, on the parse pool if enabled.
+
+    :param messages: Gmail message resources fetched with format="raw"
+    :return: Parsed email contents as dictionaries, in order; empty for the ones that failed
+    """
+
+    parse = partial(parse_email_safe, attachment_max_bytes=ATTACHMENT_DATA_MAX_BYTES)
+    pool = _parse_pool()
+    if pool is None or len(messages) < 2:
+        return [parse(message) for message in messages]
+    return list(pool.map(parse, messages, chunksize=max(1, len(messages) // (4 * GMAIL_PARSE_PROCESSES))))
 
 def get_email_details(service, msg_id, user_id="me"):
     """
@@ -68,58 +197,66 @@ def get_email_details(service, msg_id, user_id="me"):
             lambda: service.users()
                 .messages()
                 .get(userId=user_id, id=msg_id, format="raw")
-                .execute()
+                .execute(),
+            quota_units=5
         )
-        msg_raw = base64.urlsafe_b64decode(message["raw"].encode("ASCII"))
-
-        # Parse the email using the email library
-        mime_msg = BytesParser(policy=policy.default).parsebytes(msg_raw)
-
-        # Extract headers
-        headers = {header: mime_msg[header] for header in ["From", "To", "Subject", "Date"]}
-
-        # Extract body (text/plain and text/html)
-        body = ""
-        html_body = ""
-        if mime_msg.is_multipart():
-            for part in mime_msg.walk():
-                content_type = part.get_content_type()
-                content_disposition = str(part.get_content_disposition())
-                if content_type == "text/plain" and "attachment" not in content_disposition:
-                    body += part.get_content()
-                elif content_type == "text/html" and "attachment" not in content_disposition:
-                    html_body += part.get_content()
-        else:
-            content_type = mime_msg.get_content_type()
-            if content_type == "text/plain":
-                body = mime_msg.get_content()
-            elif content_type == "text/html":
-                html_body = mime_msg.get_content()
-
-        # Extract attachments (optional)
-        attachments = []
-        for part in mime_msg.iter_attachments():
-            filename = part.get_filename()
-            content = part.get_content()
-            attachments.append({
-                "filename": filename,
-                "content_type": part.get_content_type(),
-                "data": content  # This is raw binary data
-            })
-
-        email_data = {
-            "id": message["id"],
-            "threadId": message.get("threadId"),
-            "labels": message.get("labelIds"),
-            "snippet": message.get("snippet"),
-            "headers": headers,
-            "body": body,
-            "html_body": html_body,
-            "attachments": attachments
-        }
+        email_data = parse_email(message, ATTACHMENT_DATA_MAX_BYTES)
 
         logger.info("Fetched email ID: %s", str(msg_id))
         return email_data
     except Exception as e:
         logger.error("An error occurred while fetching email %s: %s", str(msg_id), str(e))
         return {}
+
+def get_email_details_batch(service, msg_ids, user_id="me", batch_size=GMAIL_FETCH_BATCH_SIZE):
+    """
+    Fetch and parse the email content for several emails using Gmail batch requests.
+    Sub-requests that fail inside a batch are retried individually with backoff.
+    
+    :param service: Authenticated Gmail service object
+    :param msg_ids: IDs of the emails to fetch
+    :param user_id: User's email address. "me" refers to the authenticated user
+    :param batch_size: Maximum number of sub-requests per batch request
+    :return: List of parsed email contents as dictionaries, in the order of msg_ids
+    """
+
+    emails = {}
+    raw_messages = {}
+    for start in range(0, len(msg_ids), batch_size):
+        chunk = msg_ids[start:start + batch_size]
+        responses = {}
+
+        def callback(request_id, response, exception):
+            responses[request_id] = (response, exception)
+
+        def execute_batch():
+            responses.clear()
+            batch = service.new_batch_http_request(callback=callback)
+            for msg_id in chunk:
+                batch.add(
+                    service.users().messages().get(userId=user_id, id=msg_id, format="raw"),
+                    request_id=msg_id
+                )
+            batch.execute()
+
+        try:
+            # Every sub-request of a batch is charged separately
+            robust_request(execute_batch, quota_units=5 * len(chunk))
+        except Exception as e:
+            logger.error("An error occurred while executing batch request: %s", str(e))
+
+        for msg_id in chunk:
+            response, exception = responses.get(msg_id, (None, None))
+            if response is not None:
+                raw_messages[msg_id] = response
+                logger.info("Fetched email ID: %s", str(msg_id))
+                continue
+            if isinstance(exception, HttpError) and exception.resp.status not in RETRYABLE_STATUSES:
+                logger.error("An error occurred while fetching email %s: %s", str(msg_id), str(exception))
+                continue
+            # Rate limited, server error or missing from the batch response
+            emails[msg_id] = get_email_details(service, msg_id, user_id=user_id)
+
+    # Parse the whole page at once so a parse pool, if enabled, uses all its workers
+    emails.update(zip(raw_messages.keys(), parse_emails(list(raw_messages.values()))))
+    return [emails.get(msg_id, {}) for msg_id in msg_ids]
@@ -2,15 +2,61 @@
 Syncing new integrations
 """
 
-from datetime import datetime
 from integrations.google.gmail.auth import authenticate_gmail
-from integrations.google.gmail.email_handler import list_emails, get_email_details
-from integrations.google.gmail.config import GMAIL_LOG_FILE
+from integrations.google.gmail.email_handler import (
+    iter_email_pages,
+    get_history_id,
+    list_history_changes,
+    get_email_details,
+    get_email_details_batch
+)
+from integrations.google.gmail.config import (
+    GMAIL_LOG_FILE,
+    GMAIL_FETCH_MODE,
+    GMAIL_SYNC_PAGE_SIZE
+)
 from logger.logger import setup_logger
 
-def fetch_emails(user_id:int, last_sync_at: int, batch_size: int = 50):
+def _fetch_details(service, msg_ids, fetch_mode):
     """
-    Method to authenticate account and fetch emails
+    Fetch and parse the given emails, dropping the ones that failed
+    """
+
+    if fetch_mode == "batch":
+        fetched = get_email_details_batch(service, msg_ids)
+    else:
+        fetched = [get_email_details(service, msg_id) for msg_id in msg_ids]
+    return [email_details for email_details in fetched if email_details]
+
+def _newest_timestamp(emails_data, last_sync_at):
+    """
+    Newest email timestamp among the emails, or last_sync_at if it is newer
+    """
+
+    for email_details in emails_data:
+        if email_details["date"] is None:
+            continue
+        dt = int(email_details["date"].timestamp())
+        if dt > last_sync_at:
+            last_sync_at = dt
+    return last_sync_at
+
+def fetch_email_pages(
+    user_id: int,
+    last_sync_at: int,
+    page_token: str = None,
+    page_size: int = GMAIL_SYNC_PAGE_SIZE,
+    fetch_mode: str = GMAIL_FETCH_MODE
+):
+    """
+    Method to authenticate account and fetch all emails after last_sync_at,
+    one page at a time, so only a single page is held in memory
+
+    :param page_token: Page token to resume a previous listing from, if any
+    :param page_size: Number of emails fetched per page
+    :param fetch_mode: "batch" to fetch emails with Gmail batch requests,
+        "serial" to fetch them one request at a time
+    :return: Generator of (emails, next page token, newest email timestamp in the page)
     """
 
     logger = setup_logger(GMAIL_LOG_FILE)
@@ -22,21 +68,52 @@ def fetch_emails(user_id:int, last_sync_at: int, batch_size: int = 50):
     # Define the search query
     query = f"after:{last_sync_at}"
 
-    # List emails
-    logger.info("Listing emails...")
-    messages = list_emails(service, query=query, max_results=batch_size)
-    logger.info("Found %d emails.", len(messages))
-
-    # Fetch and parse each email
-    emails_data = []
-    for msg in messages:
-        msg_id = msg["id"]
-        email_details = get_email_details(service, msg_id)
-        if email_details:
-            dt = int(datetime.strptime(email_details["headers"]["Date"], "%a, %d %b %Y %H:%M:%S %z").timestamp())
-            if dt > last_sync_at:
-                last_sync_at = dt
-            emails_data.append(email_details)
+    for messages, next_page_token in iter_email_pages(
+        service, query=query, page_size=page_size, page_token=page_token
+    ):
+        emails_data = _fetch_details(service, [msg["id"] for msg in messages], fetch_mode)
+        yield emails_data, next_page_token, _newest_timestamp(emails_data, last_sync_at)
 
     logger.info("Gmail Connector finished successfully")
-    return emails_data, last_sync_at
+
+def fetch_history_id(user_id: int):
+    """
+    Method to authenticate account and fetch the current mailbox history ID
+    """
+
+    service = authenticate_gmail(user_id)
+    return get_history_id(service)
+
+def fetch_email_changes(
+    user_id: int,
+    start_history_id: str,
+    page_size: int = GMAIL_SYNC_PAGE_SIZE,
+    fetch_mode: str = GMAIL_FETCH_MODE
+):
+    """
+    Method to authenticate account and fetch the emails changed since start_history_id
+
+    :param start_history_id: Mailbox history ID stored by the previous sync
+    :param page_size: Number of emails fetched per page
+    :param fetch_mode: "batch" to fetch emails with Gmail batch requests,
+        "serial" to fetch them one request at a time
+    :return: Tuple of (generator of (added emails, newest email timestamp in the page),
+        IDs of deleted emails, current labels by ID of the relabeled emails, latest history ID)
+    :raises HistoryExpiredError: If Gmail no longer has history for start_history_id
+    """
+
+    logger = setup_logger(GMAIL_LOG_FILE)
+    logger.info("Starting Gmail Connector")
+
+    # Authenticate and create Gmail service
+    service = authenticate_gmail(user_id)
+
+    added_ids, deleted_ids, labels, history_id = list_history_changes(service, start_history_id)
+
+    def pages():
+        for start in range(0, len(added_ids), page_size):
+            emails_data = _fetch_details(service, added_ids[start:start + page_size], fetch_mode)
+            yield emails_data, _newest_timestamp(emails_data, 0)
+        logger.info("Gmail Connector finished successfully")
+
+    return pages(), deleted_ids, labels, history_id
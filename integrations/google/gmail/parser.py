@@ -0,0 +1,134 @@
+"""
+Parsing of raw Gmail messages
+
+Kept free of API, network and database imports so that it loads quickly in
+the worker processes of the parse pool.
+"""
+
+import base64
+from datetime import datetime, timezone
+from email import policy
+from email.parser import BytesParser
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+from dateutil import parser as date_parser
+
+from integrations.google.gmail.attachments import attachment_kind
+from integrations.google.gmail.config import GMAIL_LOG_FILE
+from logger.logger import setup_logger
+
+logger = setup_logger(GMAIL_LOG_FILE)
+
+def parse_date(date_str: str) -> Optional[datetime]:
+    """
+    Parses an email Date header into a timezone-aware datetime.
+
+    :param date_str: Value of the Date header
+    :return: The date, in UTC if the header has no timezone, or None if it cannot be parsed
+    """
+
+    if not date_str:
+        return None
+    try:
+        date = parsedate_to_datetime(str(date_str))
+    except (ValueError, TypeError, IndexError):
+        try:
+            # Fall back to dateutil for headers that are not RFC 2822 compliant
+            date = date_parser.parse(str(date_str))
+        except (ValueError, TypeError, OverflowError):
+            return None
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+def _parse_mime(raw: bytes):
+    return BytesParser(policy=policy.default).parsebytes(raw)
+
+def attachment_metadata(part, index: int) -> Dict[str, Any]:
+    """
+    Describe an attachment part without decoding its payload.
+
+    :param part: MIME part of the attachment
+    :param index: Position of the attachment in the email
+    :return: Dictionary with index, filename, content_type and the approximate decoded size in bytes
+    """
+
+    payload = part.get_payload()
+    size = None
+    if isinstance(payload, str):
+        size = len(payload)
+        if part.get("Content-Transfer-Encoding", "").lower() == "base64":
+            size = (size - payload.count("\n") - payload.count("\r")) * 3 // 4
+    return {
+        "index": index,
+        "filename": part.get_filename(),
+        "content_type": part.get_content_type(),
+        "size": size
+    }
+
+def parse_email(message: Dict[str, Any], attachment_max_bytes: int = 0) -> Dict[str, Any]:
+    """
+    Parse a raw Gmail message resource into the email content.
+    Attachments are described by their metadata only, their payloads are
+    not decoded unless text can be extracted from them.
+
+    :param message: Gmail message resource fetched with format="raw"
+    :param attachment_max_bytes: Attachments of a kind we extract text from,
+        up to this size, also carry their content as data. 0 keeps none.
+    :return: Parsed email content as a dictionary
+    """
+
+    mime_msg = _parse_mime(base64.urlsafe_b64decode(message["raw"]))
+
+    # Extract headers
+    headers = {header: mime_msg[header] for header in ["From", "To", "Subject", "Date"]}
+
+    # Extract body (text/plain and text/html)
+    body = ""
+    html_body = ""
+    if mime_msg.is_multipart():
+        for part in mime_msg.walk():
+            content_type = part.get_content_type()
+            content_disposition = str(part.get_content_disposition())
+            if content_type == "text/plain" and "attachment" not in content_disposition:
+                body += part.get_content()
+            elif content_type == "text/html" and "attachment" not in content_disposition:
+                html_body += part.get_content()
+    else:
+        content_type = mime_msg.get_content_type()
+        if content_type == "text/plain":
+            body = mime_msg.get_content()
+        elif content_type == "text/html":
+            html_body = mime_msg.get_content()
+
+    attachments = []
+    for idx, part in enumerate(mime_msg.iter_attachments()):
+        attachment = attachment_metadata(part, idx)
+        if attachment["size"] is not None and attachment["size"] <= attachment_max_bytes \
+                and attachment_kind(attachment["content_type"], attachment["filename"]):
+            attachment["data"] = part.get_payload(decode=True)
+        attachments.append(attachment)
+
+    return {
+        "id": message["id"],
+        "threadId": message.get("threadId"),
+        "labels": message.get("labelIds"),
+        "snippet": message.get("snippet"),
+        "headers": {header: str(value) if value is not None else None for header, value in headers.items()},
+        "date": parse_date(headers["Date"]),
+        "body": body,
+        "html_body": html_body,
+        "attachments": attachments
+    }
+
+def parse_email_safe(message: Dict[str, Any], attachment_max_bytes: int = 0) -> Dict[str, Any]:
+    """
+    parse_email for the parse pool, logging failures instead of raising them.
+
+    :return: Parsed email content as a dictionary, or an empty dictionary if parsing failed
+    """
+
+    try:
+        return parse_email(message, attachment_max_bytes)
+    except Exception as e:
+        logger.error("An error occurred while parsing email %s: %s", str(message.get("id")), str(e))
+        return {}
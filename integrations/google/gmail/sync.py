@@ -1,17 +1,216 @@
-from integrations.google.gmail.fetch import fetch_emails
-from integrations.google.gmail.utils import clean_emails
-from db.mysql.utils import update_last_sync_at
+from email.utils import parseaddr
+from functools import lru_cache
+from typing import Any, NamedTuple, Optional
+
+from integrations.google.gmail.fetch import fetch_email_pages, fetch_email_changes, fetch_history_id
+from integrations.google.gmail.email_handler import HistoryExpiredError
+from integrations.google.gmail.utils import clean_emails, chunk_emails, chunk_attachments
+from integrations.google.gmail.attachments import attachment_kind, content_hash, extract_texts
+from integrations.google.gmail.config import GMAIL_LOG_FILE, GMAIL_SYNC_MODE, GMAIL_PAYLOAD_SNIPPET_CHARS
+from db.mysql.utils import get_history_id, get_sync_checkpoint, update_sync_checkpoint, complete_sync
 from llm.openai.client import OpenAIClient
 from db.qdrant.client import QdrantDBClient
+from db.blob.client import BlobStoreClient
+from db.response_cache import config as response_cache_config
+from logger.logger import setup_logger
+from ratelimit.limiter import gmail_quota_user
 
-openai_client = OpenAIClient()
-qdrant_client = QdrantDBClient()
+logger = setup_logger(GMAIL_LOG_FILE)
 
 
-def sync(user_id: int, last_sync_at: int):
-    emails, new_last_sync_at = fetch_emails(user_id, last_sync_at)
-    cleaned_emails = clean_emails(emails)
+class SyncClients(NamedTuple):
+    openai_client: OpenAIClient
+    qdrant_client: QdrantDBClient
+    blob_store: BlobStoreClient
+    response_cache: Optional[Any]
+
+
+@lru_cache(maxsize=None)
+def clients() -> SyncClients:
+    """
+    The clients sync writes through, created on first use, so importing this
+    module, e.g. in a spawned process, opens no connections or files.
+    """
+
+    response_cache = None
+    if response_cache_config.RESPONSE_CACHE_ENABLED:
+        from db.response_cache.client import ResponseCacheClient
+        response_cache = ResponseCacheClient()
+    return SyncClients(OpenAIClient(), QdrantDBClient(), BlobStoreClient(), response_cache)
+
+
+def email_payload(chunk):
+    """
+    Compact Qdrant payload for an email chunk; the full email lives in the blob store.
+    """
+
+    email = chunk["email"]
+    return {
+        "email_id": chunk["email_id"],
+        "chunk_index": chunk["chunk_index"],
+        "thread_id": email["threadId"],
+        "from": email["from"],
+        "from_address": parseaddr(email["from"] or "")[1].lower(),
+        "to": email["to"],
+        "labels": email["labels"] or [],
+        "subject": email["subject"],
+        "date": int(email["date"].timestamp()) if email["date"] else None,
+        "snippet": chunk["text"][:GMAIL_PAYLOAD_SNIPPET_CHARS],
+        "source": "email"
+    }
+
+
+def attachment_payload(chunk):
+    """
+    Compact Qdrant payload for an attachment chunk, pointing back to its parent email.
+    """
+
+    attachment = chunk["attachment"]
+    return {
+        **email_payload(chunk),
+        "source": "attachment",
+        "attachment_index": attachment["index"],
+        "filename": attachment["filename"],
+        "content_type": attachment["content_type"],
+        "content_hash": attachment["content_hash"]
+    }
+
+
+def sparse_text(chunk):
+    """
+    Text indexed for the keyword (sparse) search of a chunk, so exact sender
+    names, addresses and subjects match every chunk of the email.
+    """
+
+    email = chunk["email"]
+    return f"{email['from']}\n{email['to']}\n{email['subject']}\n{chunk['text']}"
+
+
+def chunk_point(chunk, embedding_vector):
+    """
+    Qdrant record of a chunk, keyed so that re-indexing an email overwrites its points.
+    """
+
+    if "attachment" in chunk:
+        key = f"{chunk['email_id']}/attachment/{chunk['attachment']['index']}/{chunk['chunk_index']}"
+        return key, attachment_payload(chunk), embedding_vector, sparse_text(chunk)
+    return f"{chunk['email_id']}/{chunk['chunk_index']}", email_payload(chunk), embedding_vector, sparse_text(chunk)
+
+
+def extract_attachments(user_id: int, cleaned_emails):
+    """
+    Extract the text of the attachments of the emails, once per distinct
+    content. The content is dropped from the emails, only its hash is kept.
+
+    :return: Extracted texts by content hash
+    """
+
+    pending = {}
     for email in cleaned_emails:
-        embedding_vector = openai_client.get_text_embedding(email["body"])
-        qdrant_client.insert_data(user_id, "emails", email, embedding_vector, False)
-    update_last_sync_at(user_id, new_last_sync_at)
+        for attachment in email["attachments"]:
+            data = attachment.pop("data", None)
+            if data is None:
+                continue
+            attachment["content_hash"] = content_hash(data)
+            pending.setdefault(
+                attachment["content_hash"],
+                (attachment_kind(attachment["content_type"], attachment["filename"]), data)
+            )
+
+    blob_store = clients().blob_store
+    texts = blob_store.get_attachment_texts(user_id, list(pending))
+    extracted = extract_texts({key: value for key, value in pending.items() if key not in texts})
+    blob_store.put_attachment_texts(user_id, extracted)
+    logger.info(
+        "Extracted %d attachments, %d already extracted, %d failed",
+        len(extracted), len(texts), len(pending) - len(texts) - len(extracted)
+    )
+    texts.update(extracted)
+    return texts
+
+
+def index_emails(user_id: int, emails):
+    openai_client, qdrant_client, blob_store, response_cache = clients()
+    cleaned_emails = clean_emails(emails)
+    attachment_texts = extract_attachments(user_id, cleaned_emails)
+    blob_store.put_emails(user_id, cleaned_emails)
+    chunks = chunk_emails(cleaned_emails) + chunk_attachments(cleaned_emails, attachment_texts)
+    embedding_vectors = openai_client.get_text_embeddings([chunk["text"] for chunk in chunks])
+    failed = sum(embedding_vector is None for embedding_vector in embedding_vectors)
+    if failed:
+        # Fail the page so that it is not checkpointed past, and is indexed again by the retry
+        raise RuntimeError(f"Unable to embed {failed} of {len(chunks)} email chunks")
+    points = [chunk_point(chunk, embedding_vector) for chunk, embedding_vector in zip(chunks, embedding_vectors)]
+    qdrant_client.insert_many(user_id, "emails", points)
+    # A re-indexed email may have fewer chunks than before, drop its old points once the new ones are searchable
+    qdrant_client.delete_by_field(
+        user_id, "emails", "email_id", [email["id"] for email in cleaned_emails], keep_keys=[point[0] for point in points]
+    )
+    if response_cache and cleaned_emails:
+        # Cached answers may be missing the new emails
+        response_cache.invalidate(user_id)
+
+
+def sync_query(user_id: int, last_sync_at: int, on_progress=None):
+    # Resume from the last committed page if a previous run stopped midway
+    page_token, newest_at, history_id = get_sync_checkpoint(user_id)
+    newest_at = max(last_sync_at, newest_at or 0)
+    if not page_token:
+        # Changes made while the listing runs are picked up by the next history sync
+        history_id = fetch_history_id(user_id)
+
+    indexed = 0
+    for emails, next_page_token, page_newest_at in fetch_email_pages(user_id, last_sync_at, page_token):
+        index_emails(user_id, emails)
+        newest_at = max(newest_at, page_newest_at)
+        if next_page_token:
+            update_sync_checkpoint(user_id, next_page_token, newest_at, history_id)
+        indexed += len(emails)
+        if on_progress:
+            on_progress(indexed)
+    complete_sync(user_id, newest_at, history_id)
+
+
+def sync_history(user_id: int, last_sync_at: int, start_history_id: str, on_progress=None):
+    _, qdrant_client, blob_store, response_cache = clients()
+    pages, deleted_ids, labels, history_id = fetch_email_changes(user_id, start_history_id)
+    qdrant_client.delete_by_field(user_id, "emails", "email_id", deleted_ids)
+    blob_store.delete_emails(user_id, deleted_ids)
+    for email_id, email_labels in labels.items():
+        qdrant_client.set_payload_by_field(user_id, "emails", "email_id", email_id, {"labels": email_labels})
+    blob_store.update_labels(user_id, labels)
+    if response_cache and (deleted_ids or labels):
+        response_cache.invalidate(user_id)
+
+    newest_at = last_sync_at
+    indexed = 0
+    for emails, page_newest_at in pages:
+        index_emails(user_id, emails)
+        newest_at = max(newest_at, page_newest_at)
+        indexed += len(emails)
+        if on_progress:
+            on_progress(indexed)
+    complete_sync(user_id, newest_at, history_id)
+
+
+def sync(user_id: int, last_sync_at: int, mode: str = GMAIL_SYNC_MODE, on_progress=None):
+    """
+    Sync the user's emails into the vector DB.
+
+    :param mode: "history" to sync only the changes since the stored mailbox
+        history ID, falling back to a query sync when there is none;
+        "query" to list every email after last_sync_at
+    :param on_progress: Optional callback, called with the number of emails
+        indexed so far after each committed page
+    """
+
+    start_history_id = get_history_id(user_id)
+    page_token, _, _ = get_sync_checkpoint(user_id)
+    with gmail_quota_user(user_id):
+        if mode == "history" and start_history_id and not page_token:
+            try:
+                sync_history(user_id, last_sync_at, start_history_id, on_progress)
+                return
+            except HistoryExpiredError:
+                logger.warning("History %s expired for user %s, running a full sync", start_history_id, str(user_id))
+        sync_query(user_id, last_sync_at, on_progress)
@@ -1,28 +1,143 @@
+import asyncio
+from datetime import datetime, timezone
+
 from langchain_core.tools import tool
 from langchain_core.runnables.config import RunnableConfig
-from typing import Annotated
-from db.qdrant.client import QdrantDBClient
+from typing import Annotated, List, Optional
+from db.qdrant.async_client import AsyncQdrantDBClient
+from db.blob.client import BlobStoreClient
 from llm.openai.client import OpenAIClient
+from llm.rerank import config as rerank_config
 
-qdrant_client = QdrantDBClient()
+qdrant_client = AsyncQdrantDBClient()
+blob_store = BlobStoreClient()
 openai_client = OpenAIClient()
+reranker = None
+if rerank_config.RERANK_ENABLED:
+    from llm.rerank.client import RerankerClient
+    reranker = RerankerClient()
+
+# Gmail's system label IDs are upper case, user label IDs like Label_123 are matched as given
+SYSTEM_LABELS = {
+    "INBOX", "SENT", "DRAFT", "SPAM", "TRASH", "UNREAD", "STARRED", "IMPORTANT", "CHAT",
+    "CATEGORY_PERSONAL", "CATEGORY_SOCIAL", "CATEGORY_PROMOTIONS", "CATEGORY_UPDATES", "CATEGORY_FORUMS"
+}
+
+def _label_id(label):
+    label = label.strip()
+    return label.upper() if label.upper() in SYSTEM_LABELS else label
+
+def _search_filters(sender, after, before, labels, thread_id):
+    """
+    Qdrant payload filters for the structured arguments of email_search_tool.
+    """
+
+    filters = {}
+    if sender:
+        # An address matches exactly, a name matches the words of the From header
+        if "@" in sender:
+            filters["from_address"] = sender.strip().lower()
+        else:
+            filters["from"] = {"text": sender.strip()}
+    date_range = {}
+    if after:
+        date_range["gte"] = int(datetime.fromisoformat(after).replace(tzinfo=timezone.utc).timestamp())
+    if before:
+        date_range["lt"] = int(datetime.fromisoformat(before).replace(tzinfo=timezone.utc).timestamp())
+    if date_range:
+        filters["date"] = date_range
+    if labels:
+        filters["labels"] = [_label_id(label) for label in labels]
+    if thread_id:
+        filters["thread_id"] = thread_id
+    return filters
+
+def _rerank(query, results):
+    """
+    Keep the RERANK_TOP_K results the cross-encoder finds most relevant, with trimmed snippets.
+    """
+
+    documents = [
+        f"{result['subject']}\n{result.get('filename') or ''}\n{result['snippet']}" for result in results
+    ]
+    ranked = reranker.rerank(query, documents, rerank_config.RERANK_TOP_K)
+    return [
+        {
+            **results[idx],
+            "score": score,
+            "snippet": results[idx]["snippet"][:rerank_config.RERANK_SNIPPET_CHARS]
+        }
+        for idx, score in ranked
+    ]
 
 @tool(parse_docstring=True)
-def email_search_tool(
+async def email_search_tool(
     query: str,
     config: RunnableConfig,
+    sender: Optional[str] = None,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    labels: Optional[List[str]] = None,
+    thread_id: Optional[str] = None,
 ):
     """Use this to search for information and details specific to the user.
-    This tool searches for the information about the user from their emails.
+    This tool searches for the information about the user from their emails
+    and the text of their PDF, DOCX, text and CSV attachments.
+    It returns a short snippet of each matching email, with the filename of
+    the attachment when the match is in one; use email_fetch_tool with the
+    email_id to read the full email.
+    Fill in the optional filters whenever the user mentions a sender, a
+    time period, a label or a thread, e.g. "emails from Alice last week".
     This is visible to the user.
-    
+
     Args:
         query: The query from the user
+        sender: Only emails from this sender, an email address or a name
+        after: Only emails sent on or after this date, as YYYY-MM-DD
+        before: Only emails sent before this date, as YYYY-MM-DD
+        labels: Only emails with any of these Gmail labels, e.g. INBOX, SENT, STARRED, IMPORTANT, UNREAD
+        thread_id: Only emails of this thread, as returned in thread_id by a previous search
+    """
+
+    try:
+        user_id = config.get("configurable", {}).get("user_id")
+        filters = _search_filters(sender, after, before, labels, thread_id)
+        embeddings = await openai_client.aget_text_embedding(query)
+        hits = await qdrant_client.search(
+            user_id,
+            "emails",
+            embeddings,
+            limit=rerank_config.RERANK_CANDIDATES if reranker else 10,
+            group_by="email_id",
+            query_text=query,
+            filters=filters
+        )
+        results = [
+            {"score": hit.score, **{key: value for key, value in hit.payload.items() if key != "user_id"}}
+            for hit in hits
+        ]
+        if reranker and results:
+            results = await asyncio.to_thread(_rerank, query, results)
+        return results
+    except Exception as e:
+        return f"Failed to execute. Error: {repr(e)}"
+
+@tool(parse_docstring=True)
+async def email_fetch_tool(
+    email_id: str,
+    config: RunnableConfig,
+):
+    """Use this to read the full content of one of the user's emails,
+    after finding it with email_search_tool.
+    This is visible to the user.
+
+    Args:
+        email_id: The email_id of the email, as returned by email_search_tool
     """
 
     try:
         user_id = config.get("configurable", {}).get("user_id")
-        embeddings = openai_client.get_text_embedding(query)
-        return qdrant_client.search(user_id, "emails", embeddings)
-    except BaseException as e:
+        email = await asyncio.to_thread(blob_store.get_email, user_id, email_id)
+        return email if email else f"No email found with id {email_id}"
+    except Exception as e:
         return f"Failed to execute. Error: {repr(e)}"
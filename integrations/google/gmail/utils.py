@@ -2,32 +2,79 @@
 Utils for Gmail Integration
 """
 
+import re
 import time
 import random
 import logging
 import html
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
 
+import tiktoken
 from bs4 import BeautifulSoup
-from dateutil import parser as date_parser
 from googleapiclient.errors import HttpError
 
+try:
+    from selectolax.parser import HTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    etree = lxml_html = None
+
+from integrations.google.gmail.config import (
+    GMAIL_CHUNK_TOKENS,
+    GMAIL_CHUNK_OVERLAP_TOKENS,
+    GMAIL_STRIP_BOILERPLATE
+)
+from integrations.google.gmail.parser import parse_date
+from ratelimit.limiter import acquire_gmail_quota
+
 logger = logging.getLogger(__name__)
 
-def robust_request(request_func, max_retries=5):
+RETRYABLE_STATUSES = (429, 500, 503)
+
+# Elements whose text is never part of the message. Quoted replies are kept here and
+# cut by strip_boilerplate, as the same markup also holds forwarded messages.
+HTML_DROP_SELECTORS = ('script', 'style', 'head')
+HTML_DROP_XPATH = "//script | //style | //head"
+
+# Lines after which a plain text body only holds the quoted thread
+REPLY_HEADER_PATTERN = re.compile(
+    r"^(On .{1,200} wrote:|-{2,}\s*Original Message\s*-{2,})$",
+    re.IGNORECASE
+)
+# Lines starting a forwarded message, which is the content of the email and is kept
+FORWARD_HEADER_PATTERN = re.compile(
+    r"^(-{2,}\s*Forwarded message\s*-{2,}|Begin forwarded message:)$",
+    re.IGNORECASE
+)
+# Outlook quotes a reply under a From/Sent/To/Subject block, the same block as a forward
+OUTLOOK_SENT_PATTERN = re.compile(r"^Sent:\s", re.IGNORECASE)
+OUTLOOK_REPLY_SUBJECT_PATTERN = re.compile(r"^Subject:\s*(RE|AW|SV):", re.IGNORECASE)
+SEPARATOR_PATTERN = re.compile(r"^[_\-=*]{10,}$")
+# Signature lines, only stripped within the last SIGNATURE_MAX_LINES lines of the body
+SIGNATURE_PATTERN = re.compile(r"^(--|Sent from my \w+( \w+)?|Get Outlook for \w+)$", re.IGNORECASE)
+SIGNATURE_MAX_LINES = 6
+
+def robust_request(request_func, max_retries=5, quota_units=0):
     """
     Executes a Gmail API request with exponential backoff on failure.
     
     :param request_func: Function that makes the API request
     :param max_retries: Maximum number of retries
+    :param quota_units: Gmail quota units the request costs, drawn from the
+        shared rate limiter before every attempt
     :return: Result of the API request
     """
 
     for attempt in range(max_retries):
         try:
+            acquire_gmail_quota(quota_units)
             return request_func()
         except HttpError as error:
-            if error.resp.status in [429, 500, 503]:
+            if error.resp.status in RETRYABLE_STATUSES:
                 sleep_time = (2 ** attempt) + random.uniform(0, 1)
                 logger.warning(
                     "API error %s. Retrying in %s seconds...",
@@ -44,62 +91,243 @@ def robust_request(request_func, max_retries=5):
     logger.error("Max retries exceeded")
     raise TimeoutError("Max retries exceeded")
 
-def clean_emails(emails: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _html_to_text_selectolax(html_body: str) -> str:
+    tree = SelectolaxParser(html_body)
+    for node in tree.css(", ".join(HTML_DROP_SELECTORS)):
+        node.decompose()
+    root = tree.body or tree.root
+    return root.text(separator='\n') if root else ''
+
+def _html_to_text_lxml(html_body: str) -> str:
+    try:
+        document = lxml_html.document_fromstring(html_body)
+    except (ValueError, etree.ParserError):
+        return ''
+    for element in document.xpath(HTML_DROP_XPATH):
+        element.drop_tree()
+    return '\n'.join(document.itertext())
+
+def _html_to_text_bs4(html_body: str) -> str:
+    soup = BeautifulSoup(html_body, 'html.parser')
+    for element in soup.select(', '.join(HTML_DROP_SELECTORS)):
+        element.decompose()
+    return soup.get_text(separator='\n')
+
+# Fastest HTML parser available, selectolax and lxml are optional
+if SelectolaxParser is not None:
+    _html_to_text = _html_to_text_selectolax
+elif lxml_html is not None:
+    _html_to_text = _html_to_text_lxml
+else:
+    _html_to_text = _html_to_text_bs4
+
+def html_to_text(html_body: str) -> str:
+    """
+    Extracts the visible text of an HTML body, without scripts and styles,
+    with one line per block of text.
+
+    Args:
+        html_body (str): HTML body, already decoded.
+
+    Returns:
+        str: The text, HTML entities decoded.
+    """
+    return _html_to_text(html_body)
+
+def _is_outlook_reply(lines: List[str], idx: int) -> bool:
+    """
+    Whether lines[idx] starts the header block Outlook quotes a replied-to message under.
+    """
+    if not lines[idx].lower().startswith('from:'):
+        return False
+    header = lines[idx + 1:idx + 6]
+    return any(OUTLOOK_SENT_PATTERN.match(line) for line in header) \
+        and any(OUTLOOK_REPLY_SUBJECT_PATTERN.match(line) for line in header)
+
+def strip_boilerplate(text: str) -> str:
+    """
+    Removes quoted replies and a trailing signature from a plain text body,
+    and drops blank lines and surrounding whitespace. Forwarded messages are
+    kept, they are the content of the email.
+
+    Args:
+        text (str): Plain text body.
+
+    Returns:
+        str: The text written by the sender, with any forwarded message, or
+            the whole text if nothing else would be left.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    kept = []
+    forwarded = False
+    for idx, line in enumerate(lines):
+        if not forwarded:
+            if FORWARD_HEADER_PATTERN.match(line):
+                forwarded = True
+            elif REPLY_HEADER_PATTERN.match(line) or _is_outlook_reply(lines, idx):
+                # Everything after a reply header is the quoted thread, with the separator above it
+                if kept and SEPARATOR_PATTERN.match(kept[-1]):
+                    kept.pop()
+                break
+            elif line.startswith('>'):
+                continue
+        kept.append(line)
+
+    for idx in range(max(0, len(kept) - SIGNATURE_MAX_LINES), len(kept)):
+        if SIGNATURE_PATTERN.match(kept[idx]):
+            kept = kept[:idx]
+            break
+
+    return '\n'.join(kept or lines)
+
+def clean_email(email: Dict[str, Any], strip_quoted: bool = GMAIL_STRIP_BOILERPLATE) -> Dict[str, Any]:
+    """
+    Cleans up a single email dictionary, see iter_clean_emails.
+
+    Args:
+        email (Dict[str, Any]): Email data as a dictionary.
+        strip_quoted (bool): Whether to remove quoted replies and signatures.
+
+    Returns:
+        Dict[str, Any]: Cleaned email data.
+    """
+    headers = email.get('headers', {})
+
+    # Dates are parsed once when the email is fetched
+    date = email['date'] if 'date' in email else parse_date(headers.get('Date', ''))
+
+    html_body = email.get('html_body', '')
+    # Bodies are already decoded, only HTML needs its entities decoded, by the parser
+    body = html_to_text(html_body) if html_body else email.get('body', '')
+    if strip_quoted:
+        body = strip_boilerplate(body)
+
+    return {
+        'id': email.get('id'),
+        'threadId': email.get('threadId'),
+        'labels': email.get('labels', []),
+        # The snippet is the only field Gmail returns HTML-escaped
+        'snippet': html.unescape(email.get('snippet') or ''),
+        'from': headers.get('From', ''),
+        'to': headers.get('To', ''),
+        'subject': headers.get('Subject', ''),
+        'date': date,
+        'body': body,
+        'attachments': email.get('attachments', [])
+    }
+
+def iter_clean_emails(emails: Iterable[Dict[str, Any]], strip_quoted: bool = GMAIL_STRIP_BOILERPLATE) -> Iterator[Dict[str, Any]]:
+    """
+    Cleans up email dictionaries one at a time by extracting relevant information,
+    converting HTML bodies to text and removing quoted replies and signatures.
+
+    Args:
+        emails (Iterable[Dict[str, Any]]): Email data as dictionaries.
+        strip_quoted (bool): Whether to remove quoted replies and signatures.
+
+    Yields:
+        Dict[str, Any]: Cleaned email data.
     """
-    Cleans up a list of email dictionaries by extracting relevant information,
-    decoding HTML entities, stripping HTML tags, and converting dates.
+    for email in emails:
+        yield clean_email(email, strip_quoted)
+
+def clean_emails(emails: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Cleans up a list of email dictionaries, see iter_clean_emails.
 
     Args:
-        emails (List[Dict[str, Any]]): List of email data as dictionaries.
+        emails (Iterable[Dict[str, Any]]): Email data as dictionaries.
 
     Returns:
         List[Dict[str, Any]]: List of cleaned email data.
     """
-    cleaned_emails = []
-    
+    return list(iter_clean_emails(emails))
+
+def chunk_text(text: str, max_tokens: int = GMAIL_CHUNK_TOKENS, overlap: int = GMAIL_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Splits text into overlapping windows of at most max_tokens tokens.
+
+    Args:
+        text (str): Text to split.
+        max_tokens (int): Maximum number of tokens per window.
+        overlap (int): Number of tokens shared by consecutive windows.
+
+    Returns:
+        List[str]: The windows, in order. Empty if the text is blank.
+    """
+    if not text.strip():
+        return []
+    encoding = tiktoken.get_encoding("cl100k_base")
+    tokens = encoding.encode(text, disallowed_special=())
+
+    step = max(1, max_tokens - overlap)
+    chunks = []
+    for start in range(0, len(tokens), step):
+        chunks.append(encoding.decode(tokens[start:start + max_tokens]))
+        if start + max_tokens >= len(tokens):
+            break
+    return chunks
+
+def chunk_emails(emails: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Splits the bodies of cleaned emails into token-bounded overlapping chunks,
+    each linked to its parent email.
+
+    Args:
+        emails (Iterable[Dict[str, Any]]): Cleaned email data as dictionaries.
+
+    Returns:
+        List[Dict[str, Any]]: List of chunks with the parent email ID,
+            the chunk index, the chunk text and the parent email.
+    """
+    chunks = []
+
     for email in emails:
-        cleaned_email = {}
-        
-        # Basic Fields
-        cleaned_email['id'] = email.get('id')
-        cleaned_email['threadId'] = email.get('threadId')
-        cleaned_email['labels'] = email.get('labels', [])
-        cleaned_email['snippet'] = html.unescape(email.get('snippet', ''))
-        
-        # Headers
-        headers = email.get('headers', {})
-        cleaned_email['from'] = headers.get('From', '')
-        cleaned_email['to'] = headers.get('To', '')
-        cleaned_email['subject'] = headers.get('Subject', '')
-        
-        # Date Parsing
-        date_str = headers.get('Date', '')
-        try:
-            # Using dateutil for flexible parsing
-            cleaned_email['date'] = date_parser.parse(date_str)
-        except (ValueError, TypeError):
-            # If parsing fails, set date to None
-            cleaned_email['date'] = None
-        
-        # Body Processing
-        body_text = email.get('body', '')
-        html_body = email.get('html_body', '')
-        
-        if html_body:
-            # Parse HTML and extract plain text
-            soup = BeautifulSoup(html_body, 'html.parser')
-            # Get text with proper line breaks
-            plain_text = soup.get_text(separator='\n')
-            cleaned_email['body'] = html.unescape(plain_text)
-        else:
-            # If no HTML body, use the plain text body
-            cleaned_email['body'] = html.unescape(body_text)
-        
-        # Attachments (retain as-is or process further)
-        attachments = email.get('attachments', [])
-        cleaned_email['attachments'] = attachments  # Modify as needed
-        
-        # Append the cleaned email to the list
-        cleaned_emails.append(cleaned_email)
-    
-    return cleaned_emails
\ No newline at end of file
+        # Fall back to the subject and snippet so emails without a body stay searchable
+        texts = chunk_text(email['body']) or chunk_text(f"{email['subject']}\n{email['snippet']}")
+        for idx, text in enumerate(texts):
+            chunks.append({
+                'email_id': email['id'],
+                'chunk_index': idx,
+                'text': text,
+                'email': email
+            })
+
+    return chunks
+
+def chunk_attachments(emails: Iterable[Dict[str, Any]], texts: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    Splits the extracted texts of the attachments of cleaned emails into
+    token-bounded overlapping chunks, each linked to its parent email and attachment.
+
+    Args:
+        emails (Iterable[Dict[str, Any]]): Cleaned emails, whose attachments carry a content_hash.
+        texts (Dict[str, str]): Extracted attachment texts by content hash.
+
+    Returns:
+        List[Dict[str, Any]]: List of chunks with the parent email ID, the chunk index,
+            the chunk text, the parent email and the attachment metadata.
+    """
+    chunks = []
+    # Identical attachments of several emails are only split once
+    split = {}
+
+    for email in emails:
+        for attachment in email['attachments']:
+            content_hash = attachment.get('content_hash')
+            if not texts.get(content_hash):
+                continue
+            if content_hash not in split:
+                split[content_hash] = chunk_text(texts[content_hash])
+            # Name the attachment and its email in every chunk, so chunks match queries about them
+            header = f"Attachment {attachment['filename'] or ''} of email: {email['subject']}\n"
+            for idx, text in enumerate(split[content_hash]):
+                chunks.append({
+                    'email_id': email['id'],
+                    'chunk_index': idx,
+                    'text': header + text,
+                    'email': email,
+                    'attachment': attachment
+                })
+
+    return chunks
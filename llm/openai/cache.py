@@ -0,0 +1,207 @@
+"""
+Content-addressed cache for text embeddings
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from llm.openai.config import OPENAI_LOG_FILE_PATH
+from logger.logger import setup_logger
+
+logger = setup_logger(OPENAI_LOG_FILE_PATH)
+
+
+class EmbeddingCache:
+    """
+    Two tier embedding cache: an in-process LRU backed by an SQLite file.
+    Vectors are keyed by (model, hash of normalized text) and stored on disk
+    as float32 blobs; the disk tier evicts least recently used entries once
+    it grows past max_bytes.
+    """
+
+    def __init__(self, path, memory_items=10000, max_bytes=512 * 1024 * 1024):
+        """
+        Initialise the cache.
+
+        :param path: Path of the SQLite file for the on-disk tier
+        :param memory_items (optional): Maximum number of vectors kept in memory
+        :param max_bytes (optional): Maximum total size of vectors kept on disk
+        """
+
+        self._memory = OrderedDict()
+        self._memory_items = memory_items
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)")
+        self._db.commit()
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def key(model, text):
+        """
+        Cache key for a text embedded with the given model.
+
+        :param model: Name of the embedding model
+        :param text: The input text
+
+        :return str: Hex digest of the model and the normalized text
+        """
+
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return hashlib.sha256(f"{model}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up several keys, memory first and then disk.
+
+        :param keys: Cache keys to look up
+
+        :return dict: Vectors for the keys that were found
+        """
+
+        found = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join(['?'] * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+                    self._remember(key, found[key])
+                if rows:
+                    self._db.executemany(
+                        "UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                        [(time.time(), key) for key, _ in rows]
+                    )
+                    self._db.commit()
+                self.disk_hits += len(rows)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """
+        Look up a single key.
+
+        :param key: Cache key to look up
+
+        :return list: The vector, or None on a miss
+        """
+
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, List[float]]):
+        """
+        Store several vectors in both tiers.
+
+        :param items: Mapping of cache key to vector
+        """
+
+        if not items:
+            return
+        with self._lock:
+            rows = []
+            for key, vector in items.items():
+                self._remember(key, vector)
+                blob = array("f", vector).tobytes()
+                rows.append((key, blob, len(blob), time.time()))
+            # Replaced rows already count towards the disk size, only their size change is added
+            replaced = 0
+            for start in range(0, len(rows), 500):
+                chunk = [row[0] for row in rows[start:start + 500]]
+                replaced += self._db.execute(
+                    f"SELECT COALESCE(SUM(size), 0) FROM embeddings WHERE key IN ({', '.join(['?'] * len(chunk))})",
+                    chunk
+                ).fetchone()[0]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, accessed_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._db.commit()
+            self._disk_bytes += sum(row[2] for row in rows) - replaced
+            if self._disk_bytes > self._max_bytes:
+                self._evict()
+
+    def put(self, key: str, vector: List[float]):
+        """
+        Store a single vector in both tiers.
+
+        :param key: Cache key
+        :param vector: The embedding vector
+        """
+
+        self.put_many({key: vector})
+
+    def _evict(self):
+        """
+        Delete the least recently used disk entries until the disk tier is
+        back under 90% of max_bytes.
+        """
+
+        target = int(self._max_bytes * 0.9)
+        cursor = self._db.execute("SELECT key, size FROM embeddings ORDER BY accessed_at")
+        evicted = []
+        total = self._disk_bytes
+        for key, size in cursor:
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        cursor.close()
+        self._db.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+        self._db.commit()
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        logger.info("Evicted %d cached embeddings, %d bytes on disk", len(evicted), self._disk_bytes)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hit and miss counters of the cache.
+
+        :return dict: Counters and current tier sizes
+        """
+
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes
+            }
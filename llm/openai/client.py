@@ -2,9 +2,27 @@
 Implementation of the OpenAI LLM Client
 """
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import tiktoken
 from dotenv import load_dotenv
 from langchain_openai import OpenAIEmbeddings
-from llm.openai.config import OPENAI_LOG_FILE_PATH
+from llm.openai.config import (
+    OPENAI_LOG_FILE_PATH,
+    OPENAI_EMBEDDING_MODEL,
+    OPENAI_EMBEDDING_DIMENSIONS,
+    OPENAI_EMBEDDING_BATCH_MAX_TOKENS,
+    OPENAI_EMBEDDING_BATCH_MAX_INPUTS,
+    OPENAI_EMBEDDING_MAX_CONCURRENCY,
+    OPENAI_EMBEDDING_CACHE_ENABLED,
+    OPENAI_EMBEDDING_CACHE_PATH,
+    OPENAI_EMBEDDING_CACHE_MEMORY_ITEMS,
+    OPENAI_EMBEDDING_CACHE_MAX_BYTES
+)
+from llm.openai.cache import EmbeddingCache
+from ratelimit.limiter import acquire_openai_embedding_quota
 from logger.logger import setup_logger
 
 load_dotenv()
@@ -17,6 +35,7 @@ class OpenAIClient:
 
     _instance = None
     _client = None
+    _cache = None
 
     def __new__(cls, *args, **kwargs):
         """
@@ -27,10 +46,22 @@ class OpenAIClient:
             cls._instance = super().__new__(cls, *args, **kwargs)
         return cls._instance
 
-    def __init__(self, model="text-embedding-3-small"):
-        self._client = OpenAIEmbeddings(
-            model=model
-        )
+    def __init__(self, model=OPENAI_EMBEDDING_MODEL, dimensions=OPENAI_EMBEDDING_DIMENSIONS):
+        if not self._client:
+            # text-embedding-3 models return shortened (Matryoshka) vectors when asked for fewer dimensions,
+            # None sends no dimension count, as older models like text-embedding-ada-002 reject it
+            self._client = OpenAIEmbeddings(
+                model=model,
+                dimensions=dimensions
+            )
+            self._model = model if dimensions is None else f"{model}@{dimensions}"
+            self._encoding = tiktoken.encoding_for_model(model)
+        if OPENAI_EMBEDDING_CACHE_ENABLED and not self._cache:
+            self._cache = EmbeddingCache(
+                OPENAI_EMBEDDING_CACHE_PATH,
+                memory_items=OPENAI_EMBEDDING_CACHE_MEMORY_ITEMS,
+                max_bytes=OPENAI_EMBEDDING_CACHE_MAX_BYTES
+            )
 
     def get_text_embedding(self, text):
         """
@@ -41,9 +72,155 @@ class OpenAIClient:
         :return list: The embedding vector.
         """
 
+        key = EmbeddingCache.key(self._model, text)
+        if self._cache:
+            vector = self._cache.get(key)
+            if vector is not None:
+                return vector
+
         try:
+            acquire_openai_embedding_quota(len(self._encoding.encode(text, disallowed_special=())))
             vector = self._client.embed_query(text)
+            if self._cache:
+                self._cache.put(key, vector)
             return vector
         except Exception as e:
             logger.info("An error occurred: %s", str(e))
             return None
+
+    async def aget_text_embedding(self, text):
+        """
+        Async version of get_text_embedding.
+
+        :param text: The input text to embed.
+
+        :return list: The embedding vector.
+        """
+
+        key = EmbeddingCache.key(self._model, text)
+        if self._cache:
+            # The cache reads and writes SQLite, off the event loop the chat sessions share
+            vector = await asyncio.to_thread(self._cache.get, key)
+            if vector is not None:
+                return vector
+
+        try:
+            await asyncio.to_thread(
+                acquire_openai_embedding_quota, len(self._encoding.encode(text, disallowed_special=()))
+            )
+            vector = await self._client.aembed_query(text)
+            if self._cache:
+                await asyncio.to_thread(self._cache.put, key, vector)
+            return vector
+        except Exception as e:
+            logger.info("An error occurred: %s", str(e))
+            return None
+
+    def _batch_texts(self, texts, max_tokens, max_inputs):
+        """
+        Groups texts into batches bounded by a token budget and an input count.
+
+        :param texts: The input texts to group.
+        :param max_tokens: Maximum number of tokens per batch.
+        :param max_inputs: Maximum number of texts per batch.
+
+        :return list: Batches as (indices into texts, token count) tuples.
+        """
+
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for idx, text in enumerate(texts):
+            tokens = len(self._encoding.encode(text, disallowed_special=()))
+            if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+                batches.append((batch, batch_tokens))
+                batch = []
+                batch_tokens = 0
+            batch.append(idx)
+            batch_tokens += tokens
+        if batch:
+            batches.append((batch, batch_tokens))
+        return batches
+
+    def _embed_batch(self, texts, tokens):
+        """
+        Embeds a single batch of texts in one request.
+
+        :param texts: The input texts to embed.
+        :param tokens: Number of tokens in the batch, drawn from the shared rate limiter.
+
+        :return list: The embedding vectors, or None for each text if the request failed.
+        """
+
+        try:
+            acquire_openai_embedding_quota(tokens)
+            return self._client.embed_documents(texts)
+        except Exception as e:
+            logger.info("An error occurred while embedding a batch of %d texts: %s", len(texts), str(e))
+            return [None] * len(texts)
+
+    def get_text_embeddings(
+        self,
+        texts: List[str],
+        max_tokens: int = OPENAI_EMBEDDING_BATCH_MAX_TOKENS,
+        max_inputs: int = OPENAI_EMBEDDING_BATCH_MAX_INPUTS,
+        max_concurrency: int = OPENAI_EMBEDDING_MAX_CONCURRENCY
+    ) -> List[Optional[List[float]]]:
+        """
+        Converts a list of texts into embeddings, sending them in token-budgeted
+        batches with up to max_concurrency batches in flight at once.
+
+        :param texts: The input texts to embed.
+        :param max_tokens (optional): Maximum number of tokens per request.
+        :param max_inputs (optional): Maximum number of texts per request.
+        :param max_concurrency (optional): Maximum number of concurrent requests.
+
+        :return list: The embedding vectors, in the same order as texts.
+            Texts whose batch failed map to None.
+        """
+
+        if not texts:
+            return []
+
+        keys = [EmbeddingCache.key(self._model, text) for text in texts]
+        found = self._cache.get_many(keys) if self._cache else {}
+
+        # Embed each distinct uncached text once
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in pending:
+                pending[key] = text
+        pending_keys = list(pending.keys())
+        pending_texts = list(pending.values())
+
+        if pending_texts:
+            batches = self._batch_texts(pending_texts, max_tokens, max_inputs)
+            logger.info(
+                "Embedding %d texts in %d batches, %d cached or duplicate",
+                len(pending_texts), len(batches), len(texts) - len(pending_texts)
+            )
+
+            embedded = {}
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(batches)))) as executor:
+                results = executor.map(
+                    lambda batch: self._embed_batch([pending_texts[idx] for idx in batch[0]], batch[1]),
+                    batches
+                )
+                for (batch, _), batch_vectors in zip(batches, results):
+                    for idx, vector in zip(batch, batch_vectors):
+                        if vector is not None:
+                            embedded[pending_keys[idx]] = vector
+            if self._cache:
+                self._cache.put_many(embedded)
+            found.update(embedded)
+
+        return [found.get(key) for key in keys]
+
+    def cache_stats(self):
+        """
+        Hit and miss counters of the embedding cache.
+
+        :return dict: The cache counters, empty if the cache is disabled.
+        """
+
+        return self._cache.stats() if self._cache else {}
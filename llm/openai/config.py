@@ -10,3 +10,13 @@ load_dotenv()
 
 # Configuration variables
 OPENAI_LOG_FILE_PATH = os.getenv("OPENAI_LOG_FILE_PATH", "logs/openai_client.log")
+OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+OPENAI_EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("OPENAI_EMBEDDING_BATCH_MAX_TOKENS", "100000"))
+OPENAI_EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("OPENAI_EMBEDDING_BATCH_MAX_INPUTS", "512"))
+OPENAI_EMBEDDING_MAX_CONCURRENCY = int(os.getenv("OPENAI_EMBEDDING_MAX_CONCURRENCY", "4"))
+OPENAI_EMBEDDING_CACHE_ENABLED = os.getenv("OPENAI_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+OPENAI_EMBEDDING_CACHE_PATH = os.getenv("OPENAI_EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3")
+OPENAI_EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("OPENAI_EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+OPENAI_EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("OPENAI_EMBEDDING_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Only text-embedding-3 models accept a dimension count, unset keeps the model's full size
+OPENAI_EMBEDDING_DIMENSIONS = int(os.getenv("OPENAI_EMBEDDING_DIMENSIONS")) if os.getenv("OPENAI_EMBEDDING_DIMENSIONS") else None
@@ -0,0 +1,136 @@
+"""
+Implementation of the local cross-encoder Reranker Client
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Tuple
+
+import numpy as np
+
+from llm.rerank.config import (
+    RERANK_LOG_FILE_PATH,
+    RERANK_MODEL_PATH,
+    RERANK_MAX_LENGTH,
+    RERANK_BATCH_SIZE,
+    RERANK_THREADS,
+    RERANK_CACHE_ITEMS
+)
+from logger.logger import setup_logger
+
+logger = setup_logger(RERANK_LOG_FILE_PATH)
+
+
+class RerankerClient:
+    """
+    Cross-encoder reranker running an ONNX model on the CPU, e.g.
+    cross-encoder/ms-marco-MiniLM-L-6-v2. Scores of (query, document) pairs
+    are cached in memory, so re-asked queries skip inference.
+    """
+
+    _instance = None
+    _session = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton class implementation.
+        """
+
+        if not cls._instance:
+            cls._instance = super().__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self, model_path=RERANK_MODEL_PATH):
+        """
+        Loads the model and its tokenizer.
+
+        :param model_path: Directory with model.onnx and tokenizer.json
+        """
+
+        if not self._session:
+            # Optional dependencies, only needed when reranking is enabled
+            import onnxruntime
+            from tokenizers import Tokenizer
+
+            options = onnxruntime.SessionOptions()
+            if RERANK_THREADS:
+                options.intra_op_num_threads = RERANK_THREADS
+            self._session = onnxruntime.InferenceSession(
+                os.path.join(model_path, "model.onnx"),
+                sess_options=options,
+                providers=["CPUExecutionProvider"]
+            )
+            self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+            self._tokenizer = Tokenizer.from_file(os.path.join(model_path, "tokenizer.json"))
+            self._tokenizer.enable_truncation(max_length=RERANK_MAX_LENGTH)
+            self._tokenizer.enable_padding()
+            # Inference is serialized, the session already uses all cores
+            self._lock = threading.Lock()
+            self._cache = OrderedDict()
+            self.cache_hits = 0
+            self.cache_misses = 0
+            logger.info("Loaded reranker model from %s", model_path)
+
+    @staticmethod
+    def _key(query, document):
+        return hashlib.sha256(f"{query}\0{document}".encode("utf-8")).hexdigest()
+
+    def _score_batch(self, pairs):
+        """
+        Relevance logits of a batch of (query, document) pairs.
+        """
+
+        encodings = self._tokenizer.encode_batch(pairs)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        logits = self._session.run(None, {name: value for name, value in inputs.items() if name in self._input_names})[0]
+        return logits.reshape(len(pairs), -1)[:, 0].tolist()
+
+    def score(self, query: str, documents: List[str], batch_size: int = RERANK_BATCH_SIZE) -> List[float]:
+        """
+        Relevance scores of documents for a query, higher is more relevant.
+
+        :param query: The query
+        :param documents: The documents to score
+        :param batch_size (optional): Number of pairs per inference call
+
+        :return list: The scores, in the order of documents
+        """
+
+        keys = [self._key(query, document) for document in documents]
+        with self._lock:
+            scores = {key: self._cache[key] for key in keys if key in self._cache}
+            for key in scores:
+                self._cache.move_to_end(key)
+            self.cache_hits += len(scores)
+
+            pending = [(key, document) for key, document in zip(keys, documents) if key not in scores]
+            self.cache_misses += len(pending)
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start:start + batch_size]
+                for (key, _), value in zip(batch, self._score_batch([(query, document) for _, document in batch])):
+                    scores[key] = value
+                    self._cache[key] = value
+            while len(self._cache) > RERANK_CACHE_ITEMS:
+                self._cache.popitem(last=False)
+
+        return [scores[key] for key in keys]
+
+    def rerank(self, query: str, documents: List[str], top_k: int) -> List[Tuple[int, float]]:
+        """
+        The top_k most relevant documents for a query.
+
+        :param query: The query
+        :param documents: The candidate documents
+        :param top_k: Number of documents to return
+
+        :return list: (index into documents, score) tuples, most relevant first
+        """
+
+        scores = self.score(query, documents)
+        return sorted(enumerate(scores), key=lambda item: item[1], reverse=True)[:top_k]
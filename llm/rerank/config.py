@@ -0,0 +1,21 @@
+"""
+Reranker Env Config
+"""
+
+import os
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration variables
+RERANK_LOG_FILE_PATH = os.getenv("RERANK_LOG_FILE_PATH", "logs/reranker.log")
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+RERANK_MODEL_PATH = os.getenv("RERANK_MODEL_PATH", "models/ms-marco-MiniLM-L-6-v2")
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_THREADS = int(os.getenv("RERANK_THREADS", "0"))
+RERANK_CACHE_ITEMS = int(os.getenv("RERANK_CACHE_ITEMS", "20000"))
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "50"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+RERANK_SNIPPET_CHARS = int(os.getenv("RERANK_SNIPPET_CHARS", "300"))
@@ -1,50 +1,35 @@
 import json
-from typing import Annotated
-from typing_extensions import TypedDict
-from dotenv import load_dotenv
+import time
+import uuid
 
 import streamlit as st
-from langgraph.graph import StateGraph, START, END
-from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
-from langchain_openai import ChatOpenAI
-from langchain_community.tools.tavily_search import TavilySearchResults
+from dotenv import load_dotenv
 
+from app.chat.graph import build_graph, STATE_CHANGING_TOOLS
+from app.chat.checkpointer import open_checkpointer
 from app.utils.navigation import make_sidebar
-from integrations.google.gmail.tool import email_search_tool
-from integrations.google.calendar.tool import calendar_event_create_tool
+from app.utils.async_loop import iterate_async, run_async
+from db.response_cache import config as response_cache_config
+from llm.openai.client import OpenAIClient
 
 load_dotenv()
 make_sidebar()
 
-class State(TypedDict):
-    messages: Annotated[list, add_messages]
-graph_builder = StateGraph(State)
-
-searchTool = TavilySearchResults(max_results=2)
-tools = [searchTool, email_search_tool, calendar_event_create_tool]
 
-llm = ChatOpenAI(model="gpt-4o", temperature=0.4)
-llm = llm.bind_tools(tools)
-memory = MemorySaver()
+@st.cache_resource
+def get_graph():
+    """
+    The compiled chat graph, built on the first run and shared by every
+    session and rerun, together with its clients and checkpointer.
+    """
+    return build_graph(checkpointer=open_checkpointer())
 
-def chatbot(state: State):
-    return {"messages": [llm.invoke(state["messages"])]}
 
-tool_node = ToolNode(tools=tools)
-graph_builder.add_node("tools", tool_node)
-graph_builder.add_node("chatbot", chatbot)
-
-graph_builder.add_edge(START, "chatbot")
-graph_builder.add_edge("chatbot", END)
-graph_builder.add_conditional_edges(
-    "chatbot",
-    tools_condition,
-)
-graph_builder.add_edge("tools", "chatbot")
-
-graph = graph_builder.compile(checkpointer=memory)
+graph = get_graph()
+response_cache = None
+if response_cache_config.RESPONSE_CACHE_ENABLED:
+    from db.response_cache.client import ResponseCacheClient, is_time_relative
+    response_cache = ResponseCacheClient()
 
 def render_chat_history():
     for message in st.session_state.get("message_history", []):
@@ -56,51 +41,87 @@ def render_chat_history():
                 for msg in message["content"]:
                     st.write(msg)
 
-def stream_graph_updates(user_input: str):
-    config = {"configurable": {"thread_id": st.session_state.user_id, "user_id": st.session_state.user_id}}
-    messages = []
-    if "message_history" in st.session_state:
-        for hist in st.session_state.message_history:
-            if hist["role"] in ("user", "ai"):
-                messages.append(("user" if hist["role"] == "user" else "ai", hist["content"]))
-    messages.append(("user", user_input))
-    events = graph.stream({"messages": messages}, config)
+def new_thread_id():
+    return f"{st.session_state.user_id}:{uuid.uuid4()}"
+
+
+def stream_graph_updates(user_input: str, tool_container, tool_names=None):
+    """
+    Runs a turn of the graph, yielding the tokens of the answer as the model
+    generates them, and writing tool calls and results to tool_container as they happen.
+    The names of the tools called are added to tool_names, if given.
+    """
+    config = graph_config()
+    # The checkpointer holds the conversation so far, only the new message is sent
+    messages = [("user", user_input)]
+    # Run the graph on the background loop so the tools of one turn execute concurrently
+    events = iterate_async(graph.astream({"messages": messages}, config, stream_mode=["messages", "updates"]))
 
     tool_details = []
-    final_response = ""
+    message_id = None
+
+    for mode, event in events:
+        if mode == "messages":
+            chunk, metadata = event
+            # Only the answer is streamed, not the summaries of the context manager
+            if metadata.get("langgraph_node") == "chatbot" and isinstance(chunk.content, str) and chunk.content:
+                if message_id is not None and chunk.id != message_id:
+                    yield "\n\n"
+                message_id = chunk.id
+                yield chunk.content
+            continue
 
-    for event in events:
         for key, value in event.items():
             if key == "chatbot":
                 message = value["messages"][0]
-                if message.content:
-                    final_response = message.content
-                elif 'tool_calls' in message.additional_kwargs and message.additional_kwargs['tool_calls']:
+                if 'tool_calls' in message.additional_kwargs and message.additional_kwargs['tool_calls']:
                     for tool_call in message.additional_kwargs['tool_calls']:
                         tool_name = tool_call['function']['name']
+                        if tool_names is not None:
+                            tool_names.add(tool_name)
                         tool_args = json.loads(tool_call['function']['arguments'])
                         content = f"Calling {tool_name} with args {tool_args}"
                         tool_details.append(content)
-                        st.write(content)
+                        tool_container.write(content)
             elif key == "tools":
-                tool_message = value["messages"][0]
-                tool_response_content = tool_message.content
-                try:
-                    tool_response = json.loads(tool_response_content)
-                except json.JSONDecodeError:
-                    tool_response = tool_response_content  # Fallback if not JSON
-                content = f"Tool Response: {tool_response}"
-                tool_details.append(content)
-                st.write(content)
+                for tool_message in value["messages"]:
+                    tool_response_content = tool_message.content
+                    try:
+                        tool_response = json.loads(tool_response_content)
+                    except json.JSONDecodeError:
+                        tool_response = tool_response_content  # Fallback if not JSON
+                    content = f"Tool Response: {tool_response}"
+                    tool_details.append(content)
+                    tool_container.write(content)
     
     history = st.session_state.get("message_history", []) + \
         [{"role": "tool", "content": tool_details}]
     st.session_state.message_history = history
-    return final_response
+
+
+def graph_config():
+    if "thread_id" not in st.session_state:
+        st.session_state.thread_id = new_thread_id()
+    return {"configurable": {"thread_id": st.session_state.thread_id, "user_id": st.session_state.user_id}}
+
+
+def cached_response(user_input: str, embedding):
+    """
+    The cached answer to a similar question, recorded in the conversation so
+    follow-up questions have it as context; None on a miss.
+    """
+    hit = response_cache.lookup(st.session_state.user_id, embedding)
+    if not hit:
+        return None
+    run_async(graph.aupdate_state(
+        graph_config(), {"messages": [("user", user_input), ("ai", hit["response"])]}, as_node="chatbot"
+    ))
+    return hit["response"]
 
 
 def reset_chat():
     st.session_state.message_history = []
+    st.session_state.thread_id = new_thread_id()
     render_chat_history()
 
 
@@ -119,9 +140,26 @@ if user_input:
         history = st.session_state.get("message_history", []) + [{"role": "user", "content": user_input}]
         st.session_state.message_history = history
         st.write(user_input)
-    with st.expander("Tool usage"):
-        response = stream_graph_updates(user_input)
+    # Only the first question of a chat is answered from the cache, later ones depend on the conversation
+    first_question = not any(message["role"] == "ai" for message in st.session_state.message_history)
+    embedding = None
+    response = None
+    if response_cache and first_question and not is_time_relative(user_input):
+        embedding = OpenAIClient().get_text_embedding(user_input)
+        if embedding is not None:
+            response = cached_response(user_input, embedding)
+    if response is not None:
+        with st.chat_message("ai"):
+            st.markdown(response)
+            st.caption("Answered from cache")
+    else:
+        start = time.perf_counter()
+        tool_names = set()
+        tool_container = st.expander("Tool usage")
+        with st.chat_message("ai"):
+            response = st.write_stream(stream_graph_updates(user_input, tool_container, tool_names))
+        # Replaying the answer of a turn that changed something, e.g. created an event, would not redo the change
+        if embedding is not None and response and not tool_names & STATE_CHANGING_TOOLS:
+            response_cache.put(st.session_state.user_id, user_input, embedding, response, time.perf_counter() - start)
     history = st.session_state.get("message_history", []) + [{"role": "ai", "content": response}]
     st.session_state.message_history = history
-    with st.chat_message("ai"):
-        st.markdown(response)
@@ -3,30 +3,51 @@ from datetime import datetime
 
 import streamlit as st
 
-from db.mysql.utils import get_last_sync_at
+from db.mysql.utils import get_last_sync_at, enqueue_sync_job, get_latest_sync_job
 from app.utils.navigation import make_sidebar
-from integrations.google.gmail.sync import sync
+from integrations.google.gmail.auth import authenticate_gmail
 from integrations.google.calendar.auth import authenticate_google_calendar
 
 make_sidebar()
 
-gmail_last_sync_at = get_last_sync_at(st.session_state.user_id)
 st.header("Gmail Integration")
-st.write("Last Sync At: " + (
-        gmail_last_sync_at.strftime("%c") 
-        if gmail_last_sync_at > datetime.strptime("Thu Jan 1 00:00:01 1970", "%c")
-        else "None"
+
+def sync_job_active(job):
+    return job is not None and job["status"] in ("queued", "running")
+
+def gmail_sync_status(polling):
+    gmail_last_sync_at = get_last_sync_at(st.session_state.user_id)
+    st.write("Last Sync At: " + (
+            gmail_last_sync_at.strftime("%c") 
+            if gmail_last_sync_at > datetime.strptime("Thu Jan 1 00:00:01 1970", "%c")
+            else "None"
+        )
     )
-)
+    job = get_latest_sync_job(st.session_state.user_id)
+    if job and job["status"] == "queued":
+        st.info("Sync queued")
+    elif job and job["status"] == "running":
+        st.info(f"Sync running, {job['progress']} emails indexed so far")
+    elif job and job["status"] == "failed":
+        st.error("Last Sync Failed")
+    if polling and not sync_job_active(job):
+        # The job is over, rerun the page so the status stops polling
+        st.rerun()
+
+# Refresh the status every 2 seconds only while a sync job is pending
+polling = sync_job_active(get_latest_sync_job(st.session_state.user_id))
+st.fragment(run_every=2 if polling else None)(gmail_sync_status)(polling)
+
 if st.button("Connect/Sync"):
     try:
-        st.success("Sync Started")
-        sync(st.session_state.user_id, int(gmail_last_sync_at.timestamp()))
-        st.success("Sync Completed")
-        sleep(0.5)
-        st.rerun()
+        # Authenticate here, in the user's session, so the worker only needs the stored token
+        authenticate_gmail(st.session_state.user_id)
+        enqueue_sync_job(st.session_state.user_id)
     except Exception as e:
         st.error("Sync Failed")
+    else:
+        # Rerun the page so the status shows the queued job and starts polling
+        st.rerun()
 
 st.header("Calendar Integration")
 if st.button("Connect/Refresh"):
@@ -0,0 +1,20 @@
+"""
+Config for the shared API rate limiter
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RATE_LIMIT_LOG_PATH = os.getenv("RATE_LIMIT_LOG_PATH", "logs/rate_limiter.log")
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "data/rate_limits.sqlite3")
+
+# Gmail API quota units, see https://developers.google.com/gmail/api/reference/quota
+GMAIL_USER_QUOTA_UNITS_PER_SECOND = int(os.getenv("GMAIL_USER_QUOTA_UNITS_PER_SECOND", "250"))
+GMAIL_PROJECT_QUOTA_UNITS_PER_MINUTE = int(os.getenv("GMAIL_PROJECT_QUOTA_UNITS_PER_MINUTE", "1200000"))
+
+# OpenAI embeddings budget of the account tier
+OPENAI_EMBEDDING_RPM = int(os.getenv("OPENAI_EMBEDDING_RPM", "3000"))
+OPENAI_EMBEDDING_TPM = int(os.getenv("OPENAI_EMBEDDING_TPM", "1000000"))
@@ -0,0 +1,154 @@
+"""
+Token bucket rate limiter shared by all processes on the host
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from logger.logger import setup_logger
+from ratelimit import config
+
+logger = setup_logger(config.RATE_LIMIT_LOG_PATH)
+
+# App user whose Gmail quota the current sync is spending
+_gmail_quota_user = ContextVar("gmail_quota_user", default=None)
+
+
+class RateLimiter:
+    """
+    Token buckets stored in an SQLite file, so every worker process on the
+    host draws from the same budget. Each bucket holds up to `limit` tokens
+    and refills at `limit` tokens per `window` seconds.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        """
+        Singleton class implementation.
+        """
+
+        if not cls._instance:
+            cls._instance = super().__new__(cls, *args, **kwargs)
+        return cls._instance
+
+    def __init__(self):
+        """
+        Creates the buckets table if needed.
+        """
+
+        if not hasattr(self, "_local"):
+            self._local = threading.local()
+            if os.path.dirname(config.RATE_LIMIT_DB_PATH):
+                os.makedirs(os.path.dirname(config.RATE_LIMIT_DB_PATH), exist_ok=True)
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        """
+        SQLite connection of the calling thread.
+        """
+
+        if not hasattr(self._local, "connection"):
+            self._local.connection = sqlite3.connect(config.RATE_LIMIT_DB_PATH, timeout=30, isolation_level=None)
+        return self._local.connection
+
+    def _try_acquire(self, bucket, amount, limit, window):
+        """
+        Takes amount tokens from the bucket if it has enough.
+
+        :return: 0 if the tokens were taken, else the seconds until they are available
+        """
+
+        connection = self._connection()
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (bucket, )).fetchone()
+            tokens = limit if row is None else min(limit, row[0] + (now - row[1]) * limit / window)
+            if tokens >= amount:
+                tokens -= amount
+                wait = 0
+            else:
+                wait = (amount - tokens) * window / limit
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)", (bucket, tokens, now)
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, bucket, amount, limit, window):
+        """
+        Blocks until amount tokens can be taken from the bucket.
+
+        :param bucket: Name of the bucket
+        :param amount: Number of tokens to take
+        :param limit: Bucket capacity, the number of tokens allowed per window
+        :param window: Length of the window in seconds
+        """
+
+        amount = min(amount, limit)
+        waited = 0
+        while True:
+            wait = self._try_acquire(bucket, amount, limit, window)
+            if wait <= 0:
+                break
+            # Re-check at least every second, other processes share the bucket
+            wait = min(wait, 1.0)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            logger.info("Waited %.2fs for %s tokens of %s", waited, str(amount), bucket)
+
+
+@contextmanager
+def gmail_quota_user(user_id):
+    """
+    Charges the Gmail requests made in the block to the user's per-user quota.
+
+    :param user_id: App user ID whose mailbox is being synced
+    """
+
+    token = _gmail_quota_user.set(user_id)
+    try:
+        yield
+    finally:
+        _gmail_quota_user.reset(token)
+
+
+def acquire_gmail_quota(units):
+    """
+    Blocks until the project, and the current user if any, have units Gmail quota units left.
+
+    :param units: Quota units of the request, e.g. 5 for messages.get
+    """
+
+    if not config.RATE_LIMIT_ENABLED or units <= 0:
+        return
+    limiter = RateLimiter()
+    limiter.acquire("gmail:project", units, config.GMAIL_PROJECT_QUOTA_UNITS_PER_MINUTE, 60)
+    user_id = _gmail_quota_user.get()
+    if user_id is not None:
+        limiter.acquire(f"gmail:user:{user_id}", units, config.GMAIL_USER_QUOTA_UNITS_PER_SECOND, 1)
+
+
+def acquire_openai_embedding_quota(tokens):
+    """
+    Blocks until the OpenAI embeddings budget allows one more request of the given size.
+
+    :param tokens: Number of input tokens of the request
+    """
+
+    if not config.RATE_LIMIT_ENABLED:
+        return
+    limiter = RateLimiter()
+    limiter.acquire("openai:embeddings:requests", 1, config.OPENAI_EMBEDDING_RPM, 60)
+    limiter.acquire("openai:embeddings:tokens", tokens, config.OPENAI_EMBEDDING_TPM, 60)
@@ -0,0 +1,94 @@
+"""
+Tests of the plain text cleaning of Gmail bodies
+"""
+
+from integrations.google.gmail.utils import strip_boilerplate
+
+
+def test_reply_keeps_only_the_new_text():
+    body = (
+        "Sounds good, see you then.\n"
+        "\n"
+        "On Mon, 3 Jun 2024 at 10:00, Alice <alice@example.com> wrote:\n"
+        "> Can we meet on Tuesday?\n"
+        "> Alice\n"
+    )
+    assert strip_boilerplate(body) == "Sounds good, see you then."
+
+
+def test_outlook_reply_drops_the_quoted_header_block():
+    body = (
+        "Approved.\n"
+        "\n"
+        "________________________________\n"
+        "From: Bob <bob@example.com>\n"
+        "Sent: Monday, June 3, 2024 10:00 AM\n"
+        "To: Alice <alice@example.com>\n"
+        "Subject: RE: Budget\n"
+        "\n"
+        "Please approve the budget.\n"
+    )
+    assert strip_boilerplate(body) == "Approved."
+
+
+def test_forward_keeps_the_forwarded_message():
+    body = (
+        "FYI, see below.\n"
+        "\n"
+        "---------- Forwarded message ---------\n"
+        "From: Bob <bob@example.com>\n"
+        "Date: Mon, Jun 3, 2024 at 10:00 AM\n"
+        "Subject: Invoice INV-2024-0042\n"
+        "\n"
+        "The invoice is attached, payment is due on June 30.\n"
+        "\n"
+        "On Fri, 31 May 2024 at 09:00, Alice <alice@example.com> wrote:\n"
+        "> Could you send the invoice?\n"
+    )
+    stripped = strip_boilerplate(body)
+    assert stripped.startswith("FYI, see below.")
+    assert "The invoice is attached, payment is due on June 30." in stripped
+    assert "Subject: Invoice INV-2024-0042" in stripped
+    assert "> Could you send the invoice?" in stripped
+
+
+def test_outlook_forward_keeps_the_forwarded_message():
+    body = (
+        "________________________________\n"
+        "From: Bob <bob@example.com>\n"
+        "Sent: Monday, June 3, 2024 10:00 AM\n"
+        "To: Alice <alice@example.com>\n"
+        "Subject: FW: Offsite agenda\n"
+        "\n"
+        "Day one starts at 9 with the roadmap review.\n"
+    )
+    assert "Day one starts at 9 with the roadmap review." in strip_boilerplate(body)
+
+
+def test_separator_lines_in_the_body_are_kept():
+    body = (
+        "Agenda\n"
+        "____________________\n"
+        "1. Roadmap\n"
+        "2. Hiring\n"
+        "--------------------\n"
+        "Notes follow below.\n"
+        "Sent from my phone, the numbers need checking.\n"
+        "Budget is 40k.\n"
+        "Headcount is 3.\n"
+        "Launch is in May.\n"
+        "Offsite is in June.\n"
+        "Reviews are in July.\n"
+        "Planning is in August.\n"
+    )
+    assert strip_boilerplate(body) == "\n".join(line for line in body.splitlines() if line)
+
+
+def test_trailing_signature_is_removed():
+    body = "The report is ready.\n\n-- \nJane Doe\nExample Corp\n\nSent from my iPhone\n"
+    assert strip_boilerplate(body) == "The report is ready."
+
+
+def test_signature_marker_mid_body_is_kept():
+    body = "Sent from my iPhone\n" + "\n".join(f"Line {idx}" for idx in range(10))
+    assert strip_boilerplate(body).startswith("Sent from my iPhone")
@@ -0,0 +1,16 @@
+"""
+Config for the background sync workers
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SYNC_WORKER_LOG_PATH = os.getenv("SYNC_WORKER_LOG_PATH", "logs/sync_worker.log")
+SYNC_WORKER_THREADS = int(os.getenv("SYNC_WORKER_THREADS", "2"))
+SYNC_WORKER_POLL_INTERVAL = float(os.getenv("SYNC_WORKER_POLL_INTERVAL", "5"))
+SYNC_JOB_STALE_AFTER = int(os.getenv("SYNC_JOB_STALE_AFTER", "600"))
+SYNC_JOB_HEARTBEAT_INTERVAL = float(os.getenv("SYNC_JOB_HEARTBEAT_INTERVAL", "60"))
+SYNC_SCHEDULE_INTERVAL = float(os.getenv("SYNC_SCHEDULE_INTERVAL", "900"))
+SYNC_FLEET_PROCESSES = int(os.getenv("SYNC_FLEET_PROCESSES", str(os.cpu_count() or 1)))
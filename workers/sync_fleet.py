@@ -0,0 +1,72 @@
+"""
+Fleet of sync worker processes, each running the jobs of its own shard of users
+
+Usage: python -m workers.sync_fleet [--processes N] [--threads N] [--scheduler]
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+
+from logger.logger import setup_logger
+from workers import config
+from workers.sync_worker import start_threads
+
+logger = setup_logger(config.SYNC_WORKER_LOG_PATH)
+
+
+def run_process(shard, threads, scheduler, stop_event):
+    """
+    Entry point of a fleet process: run the worker threads of one shard until stop_event is set
+    """
+
+    local_stop = threading.Event()
+    workers = start_threads(local_stop, threads, scheduler, shard)
+    logger.info("Sync fleet process for shard %d/%d started with %d threads", shard[0], shard[1], threads)
+    try:
+        while not stop_event.wait(1):
+            if not any(worker.is_alive() for worker in workers):
+                break
+    except KeyboardInterrupt:
+        pass
+    local_stop.set()
+    for worker in workers:
+        worker.join(timeout=config.SYNC_WORKER_POLL_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued Gmail syncs in several processes")
+    parser.add_argument("--processes", type=int, default=config.SYNC_FLEET_PROCESSES, help="Worker processes")
+    parser.add_argument("--threads", type=int, default=config.SYNC_WORKER_THREADS, help="Jobs run concurrently per process")
+    parser.add_argument("--scheduler", action="store_true", help="Also enqueue periodic syncs for all users")
+    args = parser.parse_args()
+
+    # The fleet already runs a process per core, a parse pool in each of them would oversubscribe the cores
+    os.environ["GMAIL_PARSE_PROCESSES"] = "0"
+    # Fresh interpreters, so no MySQL pool or client singleton is inherited across a fork
+    context = multiprocessing.get_context("spawn")
+    stop_event = context.Event()
+    processes = [
+        context.Process(
+            target=run_process,
+            args=((idx, args.processes), args.threads, args.scheduler and idx == 0, stop_event),
+            name=f"sync-fleet-{idx}"
+        )
+        for idx in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    logger.info("Sync fleet started with %d processes of %d threads", args.processes, args.threads)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping sync fleet")
+        stop_event.set()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Background worker running queued Gmail syncs, off the Streamlit request thread
+
+Usage: python -m workers.sync_worker [--threads N] [--scheduler]
+"""
+
+import argparse
+import os
+import socket
+import threading
+
+from db.mysql.utils import (
+    get_last_sync_at,
+    enqueue_sync_job,
+    claim_sync_job,
+    heartbeat_sync_job,
+    update_sync_job_progress,
+    finish_sync_job,
+    requeue_stale_sync_jobs,
+    get_connected_user_ids
+)
+from integrations.google.gmail.auth import authenticate_gmail
+from integrations.google.gmail.sync import sync
+from logger.logger import setup_logger
+from workers import config
+
+logger = setup_logger(config.SYNC_WORKER_LOG_PATH)
+
+
+class JobLostError(RuntimeError):
+    """
+    The job was requeued to another worker while this one was running it
+    """
+
+
+def heartbeat(job_id, worker_name, done, lost):
+    """
+    Refresh the job's heartbeat every SYNC_JOB_HEARTBEAT_INTERVAL seconds
+    until done is set, so a slow page does not get the job requeued. Sets
+    lost if the job no longer belongs to this worker.
+    """
+
+    while not done.wait(config.SYNC_JOB_HEARTBEAT_INTERVAL):
+        try:
+            if not heartbeat_sync_job(job_id, worker_name):
+                lost.set()
+                return
+        except Exception as e:
+            logger.error("Heartbeat of sync job %s failed: %s", str(job_id), repr(e))
+
+
+def run_job(job, worker_name):
+    """
+    Run a claimed sync job, recording its progress and outcome on the job row
+    """
+
+    job_id, user_id = job["id"], job["user_id"]
+    logger.info("Running sync job %s for user %s", str(job_id), str(user_id))
+    done = threading.Event()
+    lost = threading.Event()
+    threading.Thread(target=heartbeat, args=(job_id, worker_name, done, lost), daemon=True).start()
+
+    def on_progress(indexed):
+        # Stop at the next page rather than run alongside the worker the job was requeued to
+        if lost.is_set():
+            raise JobLostError(f"Sync job {job_id} was requeued to another worker")
+        update_sync_job_progress(job_id, worker_name, indexed)
+
+    try:
+        # Refresh the stored credentials up front, never prompting for a new login
+        authenticate_gmail(user_id, interactive=False)
+        last_sync_at = int(get_last_sync_at(user_id).timestamp())
+        sync(user_id, last_sync_at, on_progress=on_progress)
+        finish_sync_job(job_id, worker_name)
+        logger.info("Finished sync job %s", str(job_id))
+    except JobLostError as e:
+        logger.warning(str(e))
+    except Exception as e:
+        logger.error("Sync job %s failed: %s", str(job_id), repr(e))
+        finish_sync_job(job_id, worker_name, repr(e))
+    finally:
+        done.set()
+
+
+def work(worker_name, stop_event, shard=None):
+    """
+    Claim and run queued jobs until stop_event is set
+
+    :param shard: Optional (index, count), to only run the jobs of users
+        with user_id % count == index
+    """
+
+    while not stop_event.is_set():
+        try:
+            job = claim_sync_job(worker_name, shard)
+            if job is None:
+                requeue_stale_sync_jobs(config.SYNC_JOB_STALE_AFTER)
+                stop_event.wait(config.SYNC_WORKER_POLL_INTERVAL)
+                continue
+            run_job(job, worker_name)
+        except Exception as e:
+            logger.error("Worker %s error: %s", worker_name, repr(e))
+            stop_event.wait(config.SYNC_WORKER_POLL_INTERVAL)
+
+
+def schedule(stop_event, interval=config.SYNC_SCHEDULE_INTERVAL):
+    """
+    Periodically enqueue an incremental sync for every connected user
+    """
+
+    while not stop_event.is_set():
+        try:
+            user_ids = get_connected_user_ids()
+            for user_id in user_ids:
+                enqueue_sync_job(user_id)
+            logger.info("Scheduled syncs for %d users", len(user_ids))
+        except Exception as e:
+            logger.error("Scheduler error: %s", repr(e))
+        stop_event.wait(interval)
+
+
+def start_threads(stop_event, threads, scheduler, shard=None):
+    """
+    Start the worker threads, and the scheduler thread if requested
+    """
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    workers = [
+        threading.Thread(target=work, args=(f"{prefix}:{idx}", stop_event, shard), daemon=True)
+        for idx in range(threads)
+    ]
+    if scheduler:
+        workers.append(threading.Thread(target=schedule, args=(stop_event, ), daemon=True))
+    for worker in workers:
+        worker.start()
+    return workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run queued Gmail syncs")
+    parser.add_argument("--threads", type=int, default=config.SYNC_WORKER_THREADS, help="Jobs run concurrently")
+    parser.add_argument("--scheduler", action="store_true", help="Also enqueue periodic syncs for all users")
+    args = parser.parse_args()
+
+    stop_event = threading.Event()
+    workers = start_threads(stop_event, args.threads, args.scheduler)
+    logger.info("Sync worker started with %d threads", args.threads)
+    try:
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(timeout=1)
+    except KeyboardInterrupt:
+        logger.info("Stopping sync worker")
+        stop_event.set()
+
+
+if __name__ == "__main__":
+    main()